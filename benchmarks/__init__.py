@@ -0,0 +1,57 @@
+"""Helpers shared by the benchmark scripts.
+
+`load` parses a corpus with ``DoxygenParser.load_index``. `run_child` runs the
+measured part of a benchmark in a fresh interpreter, so that imports, caches
+and the peak RSS of one sample do not leak into the next; the script handles
+``--child`` and reports back with `child_result`. Nothing here imports
+``moxygen`` at module level, so a child can put another checkout first on
+``sys.path`` before loading it.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+def load(directory, log=False, **options):
+    """Parse `directory` and return the parser, the root compound and the
+    seconds ``load_index`` took, which leaves out importing ``moxygen``.
+
+    `options` go to ``load_index``, with one job unless given. The parser's
+    log is disabled unless `log` is set.
+    """
+    from moxygen.doxyparser import DoxygenParser
+
+    result = {}
+
+    def callback(err, root=None):
+        if err:
+            raise RuntimeError(err)
+        result['root'] = root
+
+    parser = DoxygenParser()
+    if not log:
+        parser.log.disabled = True
+    start = time.perf_counter()
+    parser.load_index(dict({'directory': directory, 'jobs': 1}, **options), callback)
+    return parser, result['root'], time.perf_counter() - start
+
+
+def run_child(script, *args, cwd=None):
+    """Run `script` with ``--child`` and `args` in a fresh interpreter and
+    return the value it gave to `child_result`."""
+    process = subprocess.run([sys.executable, os.path.abspath(script), '--child'] + [str(arg) for arg in args],
+                             cwd=cwd, stdout=subprocess.PIPE, text=True, check=True)
+    return json.loads(process.stdout.splitlines()[-1])
+
+
+def child_result(value):
+    """Hand `value`, anything JSON can hold, back to `run_child`."""
+    print(json.dumps(value), flush=True)
+
+
+def peak_rss():
+    """Peak RSS of this process in MB. Unix only."""
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
@@ -0,0 +1,266 @@
+"""Synthetic Doxygen XML corpus generator.
+
+Writes an ``index.xml`` and one compound file per namespace, class and group,
+valid against the ``index.xsd`` and ``compound.xsd`` schemas doxygen ships
+(copies are in ``example/xml``). The corpus is sized by the number of
+namespaces, classes per namespace, members per class and groups; descriptions
+nest lists ``--depth`` levels deep and each paragraph holds ``--refs``
+cross-references to other classes and members. Output is deterministic for
+a given ``--seed``. Run from the repository root:
+
+    python benchmarks/corpus.py OUTPUT [-n 4] [-c 25] [-m 10] [-g 4] [--validate]
+"""
+import argparse
+import glob
+import os
+import random
+import sys
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEADER = ("<?xml version='1.0' encoding='UTF-8' standalone='no'?>\n"
+          '<{root} xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:noNamespaceSchemaLocation="{schema}" '
+          'version="1.9.7" xml:lang="en-US">\n')
+
+WORDS = ('wheel', 'frame', 'gear', 'chain', 'brake', 'pedal', 'saddle', 'spoke', 'rider', 'route', 'speed',
+         'terrain', 'value', 'state', 'buffer', 'count', 'index', 'option', 'handler', 'result')
+
+
+class Corpus:
+    """Shape of a synthetic corpus, with the ids of every compound and member."""
+
+    def __init__(self, namespaces=4, classes=25, members=10, groups=4, depth=2, refs=2, seed=0):
+        self.depth = depth
+        self.refs = refs
+        self.random = random.Random(seed)
+        self.namespaces = []
+        self.classes = []
+        self.groups = ['group__group{}'.format(g) for g in range(groups)]
+        self.members = {}
+        for n in range(namespaces):
+            ns = 'ns{}'.format(n)
+            self.namespaces.append(('namespace' + ns, ns))
+            for c in range(classes):
+                name = '{}::Class{}'.format(ns, c)
+                refid = 'class{}_1_1Class{}'.format(ns, c)
+                self.classes.append((refid, name))
+                self.members[refid] = [('{}_1a{:032x}'.format(refid, self.random.getrandbits(128)), kind, member)
+                                       for kind, member in self.member_names(members)]
+
+    def member_names(self, count):
+        for m in range(count):
+            if m % 10 == 9:
+                yield 'enum', 'Kind{}'.format(m)
+            elif m % 5 == 4:
+                yield 'variable', 'field{}'.format(m)
+            else:
+                yield 'function', 'Method{}'.format(m)
+
+    # Text and descriptions
+    def words(self, count):
+        return ' '.join(self.random.choice(WORDS) for _ in range(count))
+
+    def ref(self):
+        if self.random.random() < 0.5:
+            refid, name = self.random.choice(self.classes)
+            return '<ref refid="{}" kindref="compound">{}</ref>'.format(refid, escape(name.split('::')[-1]))
+        refid, kind, name = self.random.choice(self.members[self.random.choice(self.classes)[0]])
+        return '<ref refid="{}" kindref="member">{}</ref>'.format(refid, name)
+
+    def para(self, level):
+        parts = ['<para>', self.words(6).capitalize()]
+        for _ in range(self.refs):
+            parts.extend([' ', self.ref(), ' ', self.words(3)])
+        parts.append(' uses <computeroutput>{}</computeroutput> and <bold>{}</bold>.'.format(
+            self.random.choice(WORDS), self.random.choice(WORDS)))
+        if level < self.depth:
+            parts.append('<itemizedlist>\n')
+            for _ in range(2):
+                parts.extend(['<listitem>', self.para(level + 1), '</listitem>\n'])
+            parts.append('</itemizedlist>')
+        parts.append('</para>\n')
+        return ''.join(parts)
+
+    def brief(self):
+        return '<briefdescription>\n<para>{}.</para>\n</briefdescription>\n'.format(self.words(5).capitalize())
+
+    def detailed(self, params=(), returns=False):
+        parts = ['<detaileddescription>\n', self.para(1)]
+        if params or returns:
+            parts.append('<para>')
+            if params:
+                parts.append('<parameterlist kind="param">')
+                for param in params:
+                    parts.append('<parameteritem><parameternamelist><parametername>{}</parametername></parameternamelist>'
+                                 '<parameterdescription><para>{}</para></parameterdescription></parameteritem>'
+                                 .format(param, self.words(4)))
+                parts.append('</parameterlist>\n')
+            if returns:
+                parts.append('<simplesect kind="return"><para>{}</para></simplesect>\n'.format(self.words(4)))
+            parts.append('</para>\n')
+        parts.append('</detaileddescription>\n')
+        return ''.join(parts)
+
+    # Compounds
+    def memberdef(self, cls, refid, kind, name, line):
+        header = '<memberdef kind="{}" id="{}" prot="public" static="no"'.format(kind, refid)
+        location = '<location file="src/{}.h" line="{}" column="5"/>\n'.format(cls.replace('::', '/'), line)
+        if kind == 'function':
+            params = ['value', 'count'][:self.random.randint(0, 2)]
+            return ''.join([
+                header, ' const="no" explicit="no" inline="no" virt="{}">\n'.format(
+                    self.random.choice(('non-virtual', 'virtual'))),
+                '<type>bool</type>\n',
+                '<definition>bool {}::{}</definition>\n'.format(cls, name),
+                '<argsstring>({})</argsstring>\n'.format(', '.join('int ' + param for param in params)),
+                '<name>{}</name>\n'.format(name),
+                '<qualifiedname>{}::{}</qualifiedname>\n'.format(cls, name),
+                ''.join('<param>\n<type>int</type>\n<declname>{}</declname>\n</param>\n'.format(param) for param in params),
+                self.brief(), self.detailed(params, True),
+                '<inbodydescription>\n</inbodydescription>\n', location, '</memberdef>\n'])
+        if kind == 'variable':
+            return ''.join([
+                header, ' mutable="no">\n<type>int</type>\n',
+                '<definition>int {}::{}</definition>\n<argsstring></argsstring>\n'.format(cls, name),
+                '<name>{}</name>\n'.format(name),
+                self.brief(), self.detailed(),
+                '<inbodydescription>\n</inbodydescription>\n', location, '</memberdef>\n'])
+        values = ''.join('<enumvalue id="{}_{}" prot="public">\n<name>{}_{}</name>\n{}'
+                         '<detaileddescription>\n</detaileddescription>\n</enumvalue>\n'
+                         .format(refid, v, name.upper(), v, self.brief()) for v in range(3))
+        return ''.join([
+            header, ' strong="yes">\n<type></type>\n<name>{}</name>\n'.format(name),
+            '<qualifiedname>{}::{}</qualifiedname>\n'.format(cls, name), values,
+            self.brief(), self.detailed(),
+            '<inbodydescription>\n</inbodydescription>\n', location, '</memberdef>\n'])
+
+    def class_file(self, index, refid, name):
+        sections = {'public-func': [], 'public-attrib': [], 'public-type': []}
+        for line, (member_refid, kind, member) in enumerate(self.members[refid]):
+            section = {'function': 'public-func', 'variable': 'public-attrib', 'enum': 'public-type'}[kind]
+            sections[section].append(self.memberdef(name, member_refid, kind, member, line + 10))
+        parts = ['<compounddef id="{}" kind="class" language="C++" prot="public">\n'.format(refid),
+                 '<compoundname>{}</compoundname>\n'.format(name)]
+        # Every fourth class derives from the one before it
+        if index % 4 == 1:
+            base_refid, base_name = self.classes[index - 1]
+            parts.append('<basecompoundref refid="{}" prot="public" virt="non-virtual">{}</basecompoundref>\n'
+                         .format(base_refid, base_name))
+        for kind in ('public-type', 'public-func', 'public-attrib'):
+            if sections[kind]:
+                parts.append('<sectiondef kind="{}">\n'.format(kind))
+                parts.extend(sections[kind])
+                parts.append('</sectiondef>\n')
+        parts.extend([self.brief(), self.detailed(),
+                      '<location file="src/{}.h" line="1" column="1"/>\n'.format(name.replace('::', '/')),
+                      '</compounddef>\n'])
+        return parts
+
+    def namespace_file(self, refid, name):
+        parts = ['<compounddef id="{}" kind="namespace" language="C++">\n'.format(refid),
+                 '<compoundname>{}</compoundname>\n'.format(name)]
+        parts.extend('<innerclass refid="{}" prot="public">{}</innerclass>\n'.format(class_refid, class_name)
+                     for class_refid, class_name in self.classes if class_name.startswith(name + '::'))
+        parts.extend([self.brief(), self.detailed(), '<location file="src/{}.h" line="1" column="1"/>\n'.format(name),
+                      '</compounddef>\n'])
+        return parts
+
+    def group_file(self, group, refid):
+        name = refid.split('__', 1)[1]
+        parts = ['<compounddef id="{}" kind="group">\n'.format(refid),
+                 '<compoundname>{}</compoundname>\n<title>{} module</title>\n'.format(name, name.capitalize())]
+        parts.extend('<innerclass refid="{}" prot="public">{}</innerclass>\n'.format(class_refid, class_name)
+                     for c, (class_refid, class_name) in enumerate(self.classes) if c % len(self.groups) == group)
+        parts.extend([self.brief(), self.detailed(), '</compounddef>\n'])
+        return parts
+
+    def write(self, directory):
+        os.makedirs(directory, exist_ok=True)
+
+        def write_file(refid, parts):
+            with open(os.path.join(directory, refid + '.xml'), 'w', encoding='utf-8') as file:
+                file.write(HEADER.format(root='doxygen', schema='compound.xsd'))
+                file.writelines(parts)
+                file.write('</doxygen>\n')
+
+        index = [HEADER.format(root='doxygenindex', schema='index.xsd')]
+        for c, (refid, name) in enumerate(self.classes):
+            index.append('<compound refid="{}" kind="class"><name>{}</name>\n'.format(refid, name))
+            index.extend('<member refid="{}" kind="{}"><name>{}</name></member>\n'.format(member_refid, kind, member)
+                         for member_refid, kind, member in self.members[refid])
+            index.append('</compound>\n')
+            write_file(refid, self.class_file(c, refid, name))
+        for refid, name in self.namespaces:
+            index.append('<compound refid="{}" kind="namespace"><name>{}</name>\n</compound>\n'.format(refid, name))
+            write_file(refid, self.namespace_file(refid, name))
+        for g, refid in enumerate(self.groups):
+            index.append('<compound refid="{}" kind="group"><name>{}</name>\n</compound>\n'.format(
+                refid, refid.split('__', 1)[1]))
+            write_file(refid, self.group_file(g, refid))
+        index.append('</doxygenindex>\n')
+        with open(os.path.join(directory, 'index.xml'), 'w', encoding='utf-8') as file:
+            file.writelines(index)
+        return len(self.classes) + len(self.namespaces) + len(self.groups)
+
+
+def write_corpus(directory, namespaces=4, classes=25, members=10, groups=4, depth=2, refs=2, seed=0):
+    """Write a corpus to `directory` and return the number of compounds."""
+    return Corpus(namespaces, classes, members, groups, depth, refs, seed).write(directory)
+
+
+def write_combined(directory, filename):
+    """Write the compound files of `directory` into one file, in index order,
+    like doxygen's ``combine.xslt``."""
+    index = ET.parse(os.path.join(directory, 'index.xml')).getroot()
+    with open(filename, 'w', encoding='utf-8') as file:
+        file.write('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<doxygen version="{}">'.format(
+            index.attrib.get('version', '')))
+        for compound in index.findall('compound'):
+            for element in ET.parse(os.path.join(directory, compound.attrib['refid'] + '.xml')).getroot():
+                file.write(ET.tostring(element, encoding='unicode'))
+        file.write('</doxygen>\n')
+
+
+def validate(directory, schemas=os.path.join(ROOT, 'example', 'xml')):
+    """Validate every file of a corpus against the doxygen schemas; needs lxml."""
+    from lxml import etree
+
+    compound = etree.XMLSchema(etree.parse(os.path.join(schemas, 'compound.xsd')))
+    index = etree.XMLSchema(etree.parse(os.path.join(schemas, 'index.xsd')))
+    errors = []
+    for filename in sorted(glob.glob(os.path.join(directory, '*.xml'))):
+        schema = index if os.path.basename(filename) == 'index.xml' else compound
+        if not schema.validate(etree.parse(filename)):
+            errors.extend('{}: {}'.format(os.path.basename(filename), error) for error in schema.error_log)
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('output', help="directory to write the corpus to")
+    parser.add_argument('-n', '--namespaces', type=int, default=4, help="number of namespaces")
+    parser.add_argument('-c', '--classes', type=int, default=25, help="classes per namespace")
+    parser.add_argument('-m', '--members', type=int, default=10, help="members per class")
+    parser.add_argument('-g', '--groups', type=int, default=4, help="number of groups the classes are spread over")
+    parser.add_argument('-D', '--depth', type=int, default=2, help="nesting depth of description lists")
+    parser.add_argument('-r', '--refs', type=int, default=2, help="cross-references per description paragraph")
+    parser.add_argument('-s', '--seed', type=int, default=0, help="random seed")
+    parser.add_argument('--validate', action='store_true', help="validate the corpus against the schemas (needs lxml)")
+    parser.add_argument('--combined', metavar='FILE', help="also write the corpus as one combined XML file")
+    args = parser.parse_args()
+
+    count = write_corpus(args.output, args.namespaces, args.classes, args.members, args.groups,
+                         args.depth, args.refs, args.seed)
+    print('{} compounds written to {}'.format(count, args.output))
+    if args.combined:
+        write_combined(args.output, args.combined)
+    if args.validate:
+        errors = validate(args.output)
+        print('\n'.join(errors) if errors else 'valid')
+        sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
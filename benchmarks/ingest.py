@@ -0,0 +1,78 @@
+"""Ingestion benchmark: XML parse throughput and peak RSS of each parser backend.
+
+Writes a synthetic corpus (see ``benchmarks/corpus.py``) and, in a fresh
+interpreter per run, times ``DoxygenParser.load_index`` with the memory-mapped
+ElementTree backend and, when lxml is installed, the lxml backend. The
+ElementTree backend is also timed on the corpus combined into one XML file
+and packed into a tar archive. Reports the XML read per second and the peak
+RSS. Pass ``--compare`` with the path of another checkout (e.g. a ``git
+worktree`` of an older commit) to measure its parser on the same corpus.
+Unix only. Run from the repository root:
+
+    python benchmarks/ingest.py [-c 2000] [-m 20] [-n 3] [--compare ../pymoxygen-old]
+"""
+import argparse
+import glob
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks import child_result, load, peak_rss, run_child  # noqa: E402
+from benchmarks.corpus import write_combined, write_corpus  # noqa: E402
+
+
+def child(repo, directory, backend):
+    sys.path.insert(0, repo)
+    parser, root, elapsed = load(directory, xml_parser=backend)
+    child_result([elapsed, peak_rss()])
+
+
+def measure(repo, directory, backend, repeat):
+    samples = [run_child(__file__, repo, directory, backend) for _ in range(repeat)]
+    return min(elapsed for elapsed, rss in samples), min(rss for elapsed, rss in samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-c', '--classes', type=int, default=2000, help="number of classes")
+    parser.add_argument('-m', '--members', type=int, default=20, help="members per class")
+    parser.add_argument('-n', '--repeat', type=int, default=3, help="runs per backend, the best one is reported")
+    parser.add_argument('--compare', action='append', default=[], help="another checkout to measure")
+    args = parser.parse_args()
+
+    # Imported here so that children load the moxygen of the checkout they measure
+    from moxygen import ingest
+    backends = [backend for backend in ('etree', 'lxml') if backend == 'etree' or ingest.lxml_etree is not None]
+    work = tempfile.mkdtemp(prefix='moxygen-bench-')
+    xml = os.path.join(work, 'xml')
+    inputs = {'directory': xml, 'combined': os.path.join(work, 'all.xml'), 'tar': os.path.join(work, 'xml.tar')}
+    runs = [(ROOT, backend, 'directory') for backend in backends] + \
+        [(ROOT, 'etree', 'combined'), (ROOT, 'etree', 'tar')] + \
+        [(os.path.abspath(repo), 'etree', 'directory') for repo in args.compare]
+    try:
+        write_corpus(xml, namespaces=1, classes=args.classes, members=args.members, groups=0)
+        write_combined(xml, inputs['combined'])
+        with tarfile.open(inputs['tar'], 'w') as archive:
+            archive.add(xml, 'xml')
+        size = sum(os.path.getsize(filename) for filename in glob.glob(os.path.join(xml, '*.xml')))
+        print('corpus: {:.1f} MB of XML'.format(size / 1e6))
+        print('{:<40} {:>8} {:>10} {:>10} {:>10} {:>14}'.format('checkout', 'parser', 'input', 'time (s)', 'MB/s',
+                                                                 'peak RSS (MB)'))
+        for repo, backend, source in runs:
+            elapsed, rss = measure(repo, inputs[source], backend, args.repeat)
+            print('{:<40} {:>8} {:>10} {:>10.2f} {:>10.1f} {:>14.1f}'.format(
+                os.path.relpath(repo), backend if repo == ROOT else '-', source, elapsed, size / 1e6 / elapsed, rss))
+    finally:
+        shutil.rmtree(work)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        child(*sys.argv[2:5])
+    else:
+        main()
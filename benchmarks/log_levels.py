@@ -0,0 +1,79 @@
+"""Logging benchmark: parse and render throughput at each log level.
+
+Generates a synthetic corpus (see ``benchmarks/corpus.py``) and, for each
+verbosity, parses it and renders it as single file output with the log going
+to a file, as ``-L`` does, and the console output to ``/dev/null``. Shows what
+diagnostic output costs when it is on and that it costs next to nothing when
+it is off. Run from the repository root:
+
+    python benchmarks/log_levels.py [-c 50] [-m 10] [-n 3]
+"""
+import argparse
+import os
+import runpy
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks import load  # noqa: E402
+from benchmarks.corpus import write_corpus  # noqa: E402
+from moxygen.logger import initLogger  # noqa: E402
+from moxygen.template import Renderer  # noqa: E402
+
+LEVELS = (('quiet', {'quiet': True}), ('default', {}), ('-v', {'verbose': 1}), ('-vv', {'verbose': 2}))
+
+
+def run(options):
+    parser, root, parsed = load(log=True, **options)
+
+    root.filter_children(options['filters'])
+    compounds = root.to_filtered_array('compounds')
+    renderer = Renderer(options)
+    renderer.register_helper(options)
+    renderer.load(options['template'])
+    start = time.perf_counter()
+    renderer.render_array(compounds)
+    return len(parser.references), parsed, len(compounds), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-c', '--classes', type=int, default=50, help="classes per namespace")
+    parser.add_argument('-m', '--members', type=int, default=10, help="members per class")
+    parser.add_argument('-n', '--repeat', type=int, default=3, help="samples per level, the best one is reported")
+    args = parser.parse_args()
+
+    filters = runpy.run_path(os.path.join(ROOT, 'moxygen.py'), run_name='moxygen_main')['Moxygen']().defaultOptions['filters']
+    work = tempfile.mkdtemp(prefix='moxygen-bench-')
+    try:
+        directory = os.path.join(work, 'xml')
+        write_corpus(directory, classes=args.classes, members=args.members)
+        print('{:<10} {:>18} {:>18} {:>14}'.format('level', 'parse (refs/s)', 'render (cmp/s)', 'log (KB)'))
+        for name, level in LEVELS:
+            logfile = os.path.join(work, 'bench.log')
+            options = dict(level, directory=directory, logfile=logfile, jobs=1, filters=filters,
+                           template=os.path.join(ROOT, 'templates', 'cpp'))
+            best_parse = best_render = 0
+            for _ in range(args.repeat):
+                # Console output goes to /dev/null so the terminal is not measured
+                stderr, sys.stderr = sys.stderr, open(os.devnull, 'w')
+                try:
+                    initLogger(options, {})
+                    references, parsed, compounds, rendered = run(options)
+                finally:
+                    sys.stderr.close()
+                    sys.stderr = stderr
+                best_parse = max(best_parse, references / parsed)
+                best_render = max(best_render, compounds / rendered)
+            print('{:<10} {:>18.0f} {:>18.0f} {:>14.1f}'.format(name, best_parse, best_render,
+                                                                os.path.getsize(logfile) / 1024))
+    finally:
+        shutil.rmtree(work)
+
+
+if __name__ == '__main__':
+    main()
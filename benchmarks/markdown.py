@@ -0,0 +1,60 @@
+"""Micro-benchmark of description rendering (``DoxygenParser.to_markdown``).
+
+Collects every description and type element of the example corpus and renders
+the set repeated ``--scale`` times. Run from the repository root:
+
+    python benchmarks/markdown.py [-d example/xml] [-s 1 10 100]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from moxygen.doxyparser import DoxygenParser  # noqa: E402
+
+TAGS = ('briefdescription', 'detaileddescription', 'inbodydescription', 'type', 'declname')
+
+
+def collect(directory):
+    elements = []
+    for filename in sorted(glob.glob(os.path.join(directory, '*.xml'))):
+        if os.path.basename(filename) in ('index.xml', 'Doxyfile.xml'):
+            continue
+        root = ET.parse(filename).getroot()
+        for tag in TAGS:
+            elements.extend(root.iter(tag))
+    return elements
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-d', '--directory', default=os.path.join(ROOT, 'example', 'xml'), help="doxygen XML directory")
+    parser.add_argument('-s', '--scale', type=int, nargs='+', default=[1, 10, 100], help="corpus repetitions")
+    parser.add_argument('-n', '--repeat', type=int, default=5, help="samples per scale, the best one is reported")
+    args = parser.parse_args()
+
+    elements = collect(args.directory)
+    source_bytes = sum(len(ET.tostring(element)) for element in elements)
+    doxyparser = DoxygenParser()
+
+    print('{:>6} {:>10} {:>12} {:>14} {:>10}'.format('scale', 'elements', 'time (ms)', 'elements/s', 'MB/s'))
+    for scale in args.scale:
+        corpus = elements * scale
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for element in corpus:
+                doxyparser.to_markdown(element)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print('{:>6} {:>10} {:>12.2f} {:>14.0f} {:>10.2f}'.format(
+            scale, len(corpus), best * 1000, len(corpus) / best, source_bytes * scale / best / 1e6))
+
+
+if __name__ == '__main__':
+    main()
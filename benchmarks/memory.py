@@ -0,0 +1,51 @@
+"""Memory benchmark: peak RSS of ``DoxygenParser.load_index`` on a synthetic corpus.
+
+Writes a corpus (see ``benchmarks/corpus.py``) of ``--classes`` classes with
+``--members`` members each and parses it in a fresh interpreter. Pass
+``--compare`` with the path of another checkout (e.g. a ``git worktree`` of an
+older commit) to measure it on the same corpus. Unix only. Run from the repository root:
+
+    python benchmarks/memory.py [-c 2000] [-m 50] [--compare ../pymoxygen-old]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks import child_result, load, peak_rss, run_child  # noqa: E402
+from benchmarks.corpus import write_corpus  # noqa: E402
+
+
+def child(repo, directory):
+    sys.path.insert(0, repo)
+    parser, root, elapsed = load(directory)
+    child_result([len(parser.references), elapsed, peak_rss()])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-c', '--classes', type=int, default=2000, help="number of classes")
+    parser.add_argument('-m', '--members', type=int, default=50, help="members per class")
+    parser.add_argument('--compare', action='append', default=[], help="another checkout to measure")
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix='moxygen-bench-')
+    try:
+        write_corpus(work, namespaces=1, classes=args.classes, members=args.members, groups=0, depth=1, refs=1)
+        print('{:<40} {:>12} {:>10} {:>14}'.format('checkout', 'references', 'time (s)', 'peak RSS (MB)'))
+        for repo in [ROOT] + args.compare:
+            references, elapsed, rss = run_child(__file__, os.path.abspath(repo), work)
+            print('{:<40} {:>12} {:>10.2f} {:>14.1f}'.format(repo, references, elapsed, rss))
+    finally:
+        shutil.rmtree(work)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        child(sys.argv[2], sys.argv[3])
+    else:
+        main()
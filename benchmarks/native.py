@@ -0,0 +1,106 @@
+"""Native template benchmark: equivalence with pybars and rendering throughput.
+
+Parses the example corpus and a synthetic corpus (see
+``benchmarks/corpus.py``), renders every compound with each built-in template
+through pybars and through ``moxygen.native``, and fails if any output
+differs. Then reports compounds rendered per second by both backends. Run
+from the repository root:
+
+    python benchmarks/native.py [-c 25] [-m 10] [-n 3]
+"""
+import argparse
+import os
+import runpy
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks import load  # noqa: E402
+from benchmarks.corpus import write_corpus  # noqa: E402
+from moxygen.template import Renderer  # noqa: E402
+
+TEMPLATES = os.path.join(ROOT, 'templates', 'cpp')
+
+
+def parse(directory, filters):
+    """Every distinct compound of the corpus, filtered as for single file output."""
+    _, root, _ = load(directory)
+    root.filter_children(filters)
+    compounds = [root]
+    seen = set()
+    for compound in root.to_array():
+        if id(compound) not in seen:
+            seen.add(id(compound))
+            compounds.append(compound)
+    return compounds
+
+
+def renderers():
+    pybars, native = Renderer({'native': False}), Renderer({})
+    for renderer in (pybars, native):
+        renderer.register_helper(renderer.options)
+        renderer.load(TEMPLATES)
+    assert not pybars.native and set(native.native) == set(native.templates)
+    return pybars, native
+
+
+def check(compounds, pybars, native):
+    mismatches = 0
+    for compound in compounds:
+        for template in native.native:
+            expected = pybars.render_template(template, compound)
+            if native.render_template(template, compound) != expected:
+                print('mismatch: {} template for {} {}'.format(template, compound.kind, compound.name))
+                mismatches += 1
+    return mismatches
+
+
+def throughput(renderer, jobs, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for template, compound in jobs:
+            renderer.render_template(template, compound)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(jobs) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-c', '--classes', type=int, default=25, help="classes per namespace of the synthetic corpus")
+    parser.add_argument('-m', '--members', type=int, default=10, help="members per class of the synthetic corpus")
+    parser.add_argument('-n', '--repeat', type=int, default=3, help="samples per backend, the best one is reported")
+    args = parser.parse_args()
+
+    filters = runpy.run_path(os.path.join(ROOT, 'moxygen.py'), run_name='moxygen_main')['Moxygen']().defaultOptions['filters']
+    pybars, native = renderers()
+    work = tempfile.mkdtemp(prefix='moxygen-bench-')
+    try:
+        write_corpus(work, classes=args.classes, members=args.members)
+        corpora = (('example', parse(os.path.join(ROOT, 'example', 'xml'), filters)),
+                   ('synthetic', parse(work, filters)))
+    finally:
+        shutil.rmtree(work)
+
+    failed = False
+    print('{:<12} {:>10} {:>12} {:>16} {:>16} {:>9}'.format(
+        'corpus', 'compounds', 'mismatches', 'pybars (cmp/s)', 'native (cmp/s)', 'speed-up'))
+    for name, compounds in corpora:
+        mismatches = check(compounds, pybars, native)
+        failed = failed or mismatches > 0
+        jobs = [(template, compound) for compound in compounds
+                for template in [native.template_name(compound)] if template is not None]
+        slow = throughput(pybars, jobs, args.repeat)
+        fast = throughput(native, jobs, args.repeat)
+        print('{:<12} {:>10} {:>12} {:>16.0f} {:>16.0f} {:>8.1f}x'.format(
+            name, len(compounds), mismatches, slow, fast, fast / slow))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Pipeline benchmark: time to the first written file and total time.
+
+Writes a synthetic corpus (see ``benchmarks/corpus.py``) and runs
+``moxygen.py`` on it in `classes` mode, one file per class, with each
+``--jobs`` value, in a fresh interpreter per run. Times are taken from the
+call to ``main()``; the time to the first file is taken from the oldest
+modification time among the output files. Pass ``--compare`` with the path
+of another checkout (e.g. a ``git worktree`` of an older commit) to run it on
+the same corpus. Run from the repository root:
+
+    python benchmarks/pipeline.py [-c 100] [-m 20] [-j 1 2 4] [-n 3] [--compare ../pymoxygen-old]
+"""
+import argparse
+import glob
+import os
+import runpy
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks import child_result, run_child  # noqa: E402
+from benchmarks.corpus import write_corpus  # noqa: E402
+
+
+def child(repo, directory, output, jobs):
+    sys.path.insert(0, repo)
+    main = runpy.run_path(os.path.join(repo, 'moxygen.py'), run_name='moxygen_main')['main']
+    sys.argv = ['moxygen.py', '-d', directory, '-c', '1', '-q', '-o', os.path.join(output, 'api_%s.md'), '-j', jobs]
+    start = time.time()
+    main()
+    total = time.time() - start
+    first = min(os.stat(filename).st_mtime for filename in glob.glob(os.path.join(output, '*.md'))) - start
+    child_result([first, total])
+
+
+def sample(repo, directory, output, jobs):
+    shutil.rmtree(output, ignore_errors=True)
+    os.makedirs(output)
+    return run_child(__file__, repo, directory, output, jobs, cwd=repo)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-c', '--classes', type=int, default=100, help="classes per namespace")
+    parser.add_argument('-m', '--members', type=int, default=20, help="members per class")
+    parser.add_argument('-j', '--jobs', type=int, nargs='+', default=[1, 2, 4], help="--jobs values to run")
+    parser.add_argument('-n', '--repeat', type=int, default=3, help="runs per configuration, the best one is reported")
+    parser.add_argument('--compare', action='append', default=[], help="another checkout to run")
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix='moxygen-bench-')
+    try:
+        xml = os.path.join(work, 'xml')
+        write_corpus(xml, classes=args.classes, members=args.members)
+        print('{:<40} {:>6} {:>16} {:>12}'.format('checkout', 'jobs', 'first file (s)', 'total (s)'))
+        for repo in [ROOT] + [os.path.abspath(repo) for repo in args.compare]:
+            for jobs in args.jobs:
+                samples = [sample(repo, xml, os.path.join(work, 'out'), jobs) for _ in range(args.repeat)]
+                print('{:<40} {:>6} {:>16.2f} {:>12.2f}'.format(
+                    os.path.relpath(repo), jobs, min(first for first, total in samples),
+                    min(total for first, total in samples)))
+    finally:
+        shutil.rmtree(work)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        child(*sys.argv[2:6])
+    else:
+        main()
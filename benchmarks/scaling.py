@@ -0,0 +1,90 @@
+"""Scaling benchmark: throughput of each stage on synthetic corpora of growing size.
+
+Generates a corpus with ``benchmarks/corpus.py`` at each ``--scale`` (the
+number of classes per namespace is multiplied) and, in a fresh interpreter per
+scale, times ``DoxygenParser.load_index``, ``Compound.filter_children``,
+``Renderer.render_array`` and ``helper.write_compound`` for single file output.
+Reports compounds per second for each stage and the peak RSS. Unix only. Run
+from the repository root:
+
+    python benchmarks/scaling.py [-s 1 10 100] [-n 4] [-c 10] [-m 10]
+"""
+import argparse
+import os
+import runpy
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks import child_result, load, peak_rss, run_child  # noqa: E402
+from benchmarks.corpus import write_corpus  # noqa: E402
+
+STAGES = ('load_index', 'filter_children', 'render_array', 'write_compound')
+
+
+def child(directory, output):
+    from moxygen import helper
+    from moxygen.template import Renderer
+
+    filters = runpy.run_path(os.path.join(ROOT, 'moxygen.py'), run_name='moxygen_main')['Moxygen']().defaultOptions['filters']
+    options = {'directory': directory, 'output': output, 'jobs': 1, 'groups': False, 'classes': False,
+               'pages': False, 'filters': filters, 'template': os.path.join(ROOT, 'templates', 'cpp')}
+
+    renderer = Renderer(options)
+    renderer.register_helper(options)
+    renderer.load(options['template'])
+    times = {}
+
+    parser, root, times['load_index'] = load(directory, filters=filters)
+
+    start = time.perf_counter()
+    root.filter_children(options['filters'])
+    times['filter_children'] = time.perf_counter() - start
+
+    compounds = root.to_filtered_array('compounds')
+    compounds.insert(0, root)
+    start = time.perf_counter()
+    contents = renderer.render_array(compounds)
+    times['render_array'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    helper.write_compound(root, contents, parser.references, options)
+    times['write_compound'] = time.perf_counter() - start
+
+    child_result({'compounds': len(set(map(id, root.to_array()))), 'times': times, 'rss': peak_rss()})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-s', '--scale', type=int, nargs='+', default=[1, 10, 100], help="corpus size multipliers")
+    parser.add_argument('-n', '--namespaces', type=int, default=4, help="number of namespaces")
+    parser.add_argument('-c', '--classes', type=int, default=10, help="classes per namespace at scale 1")
+    parser.add_argument('-m', '--members', type=int, default=10, help="members per class")
+    parser.add_argument('-g', '--groups', type=int, default=4, help="number of groups")
+    args = parser.parse_args()
+
+    print('{:>6} {:>10} '.format('scale', 'compounds') +
+          ' '.join('{:>16}'.format(stage) for stage in STAGES) + ' {:>14}'.format('peak RSS (MB)'))
+    print('{:>17} '.format('') + ' '.join('{:>16}'.format('compounds/s') for stage in STAGES))
+    for scale in args.scale:
+        work = tempfile.mkdtemp(prefix='moxygen-bench-')
+        try:
+            directory = os.path.join(work, 'xml')
+            write_corpus(directory, args.namespaces, args.classes * scale, args.members, args.groups)
+            result = run_child(__file__, directory, os.path.join(work, 'api.md'))
+        finally:
+            shutil.rmtree(work)
+        rates = [result['compounds'] / max(result['times'][stage], 1e-9) for stage in STAGES]
+        print('{:>6} {:>10} '.format(scale, result['compounds']) +
+              ' '.join('{:>16.0f}'.format(rate) for rate in rates) + ' {:>14.1f}'.format(result['rss']))
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        child(sys.argv[2], sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,77 @@
+"""Startup benchmark: time from ``main()`` to the first rendered compound.
+
+Every sample runs in a fresh interpreter so the in-process template memo does
+not hide compilation. The built-in templates are timed with pybars, which
+compiles them or reads them from the ``--cache``, and with their native
+renderers, which compile nothing. Run from the repository root:
+
+    python benchmarks/startup.py [-d example/xml] [-n 5]
+"""
+import argparse
+import os
+import runpy
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks import child_result, run_child  # noqa: E402
+
+
+class FirstRender(Exception):
+    pass
+
+
+def child(argv):
+    # Stop at the first call to Renderer.render and report the elapsed time.
+    from moxygen.template import Renderer
+
+    def render(self, compound):
+        raise FirstRender()
+    Renderer.render = render
+
+    main = runpy.run_path(os.path.join(ROOT, 'moxygen.py'), run_name='moxygen_main')['main']
+    sys.argv = ['moxygen.py'] + argv
+    start = time.perf_counter()
+    try:
+        main()
+    except FirstRender:
+        pass
+    child_result(time.perf_counter() - start)
+
+
+def sample(argv):
+    return run_child(__file__, *argv, cwd=ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-d', '--directory', default=os.path.join(ROOT, 'example', 'xml'), help="doxygen XML directory")
+    parser.add_argument('-n', '--repeat', type=int, default=5, help="samples per configuration")
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix='moxygen-bench-')
+    try:
+        argv = ['-d', args.directory, '-o', os.path.join(work, 'api.md'), '-L', os.path.join(work, 'bench.log')]
+        cache = ['-C', os.path.join(work, 'cache')]
+        pybars = argv + ['--no-native']
+        sample(pybars + cache)  # warm the compiled template cache
+
+        print('{:<24} {:>12} {:>12}'.format('configuration', 'median (ms)', 'min (ms)'))
+        for name, run_argv in (('pybars, no cache', pybars), ('pybars, with --cache', pybars + cache),
+                               ('native, no cache', argv), ('native, with --cache', argv + cache)):
+            times = [sample(run_argv) for _ in range(args.repeat)]
+            print('{:<24} {:>12.1f} {:>12.1f}'.format(name, statistics.median(times) * 1000, min(times) * 1000))
+    finally:
+        shutil.rmtree(work)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--child']:
+        child(sys.argv[2:])
+    else:
+        main()
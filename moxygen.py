@@ -1,10 +1,16 @@
 import os
+import sys
+import time
 import argparse
 from moxygen import helper, template
+from moxygen.cache import Cache
 from moxygen.compound import Compound
-from moxygen.doxyparser import DoxygenParser
-from moxygen.template import Renderer
-from moxygen.logger import initLogger
+from moxygen.doxyparser import DoxygenParser, source_fingerprint
+from moxygen.plan import ParsePlan
+from moxygen.search import SearchIndex
+from moxygen.template import Renderer, RenderBatch
+from moxygen.logger import getLogger, initLogger
+from moxygen.profile import getProfiler, initProfiler
 
 class Moxygen:
     def __init__(self):
@@ -16,10 +22,25 @@ class Moxygen:
             'anchors': True,
             'language': 'cpp',
             'template': 'templates',
+            'templates': None,
             'pages': False,
             'classes': False,
             'output_s': 'api_%s.md',
-            'logfile': 'pymoxygen.log',
+            'logfile': None,
+            'jobs': 1,
+            'cache': None,
+            'cache_dir': '.moxygen-cache',
+            'skip_unchanged': False,
+            'native': True,
+            'interval': 0.5,
+            'only': None,
+            'xml_parser': 'etree',
+            'targets': None,
+            'profile': None,
+            'profile_file': 'moxygen-profile.json',
+            'profile_top': 10,
+            'search': None,
+            'search_file': 'search.json',
             'filters': {
                 'members': [
                     'define',
@@ -56,9 +77,51 @@ class Moxygen:
         self.doxyparser = DoxygenParser()
 
     def run(self, options):
+        cache = self.setup(options)
+        self.generate(options, cache)
+
+    def setup(self, options):
+        """Set up logging, fill in default options and open the cache, if any.
+
+        Options left out take their defaults, as when they are not given on
+        the command line, so a caller only passes the ones it overrides. Each
+        entry of `targets` is completed with the options it does not set
+        itself. A `search` index is written for the first target, next to
+        its output when `search` is True.
+        """
+        # The default output depends on the mode, see `sanitize`
+        options.setdefault('output', None)
+        for key, value in self.defaultOptions.items():
+            options.setdefault(key, value)
         initLogger(options, self.defaultOptions)
-        r = Renderer(options)
-        # Sanitize options
+        self.sanitize(options)
+        if options.get('targets'):
+            targets = []
+            for target in options['targets']:
+                target = dict(options, **target)
+                target['targets'] = None
+                self.sanitize(target)
+                targets.append(target)
+            if len({target['output'] for target in targets}) != len(targets):
+                raise ValueError("Every target needs its own `output` file parameter.")
+            options['targets'] = targets
+        if options.get('jobs') is None:
+            options['jobs'] = self.defaultOptions['jobs']
+        if options.get('search') is True:
+            output = (options.get('targets') or [options])[0]['output']
+            options['search'] = os.path.join(os.path.dirname(output), self.defaultOptions['search_file'])
+
+        # Incremental regeneration cache, stored next to the output by default
+        cache = None
+        if options.get('cache'):
+            if options['cache'] is True:
+                options['cache'] = os.path.join(os.path.dirname(options['output']), self.defaultOptions['cache_dir'])
+            cache = Cache(options['cache'])
+            cache.load()
+        return cache
+
+    def sanitize(self, options):
+        """Fill in the output, template and filter options of one target."""
         if options['output'] is None:
             if options['classes'] or options['groups']:
                 options['output'] = self.defaultOptions['output_s']
@@ -74,82 +137,249 @@ class Moxygen:
                 options['template'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), self.defaultOptions['template'], options['language'])
             else:
                 options['template'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), self.defaultOptions['template'], self.defaultOptions['language'])
-        
+        else:
+            options['template'] = options['templates']
+
         if options['filters'] is None:
             options['filters'] = self.defaultOptions['filters']
         if options['anchors'] is None:
             options['anchors'] = self.defaultOptions['anchors']
-        if options['anchors'] is None:
-            options['anchors'] = self.defaultOptions['anchors']
 
-        # Load template
-        r.register_helper(options)
-        r.load(options['template'])
+    def generate(self, options, cache=None):
+        """Parse the XML once and write the output of every target, with options already set up."""
+        profiler = initProfiler(options)
+        sink = helper.OutputSink(cache, options.get('skip_unchanged'), options['jobs'])
+        # Each file goes to the writer threads of the sink while the next ones are rendered
+        try:
+            for filepath, contents in self.files(options, cache):
+                sink.put(filepath, contents)
+        except BaseException:
+            # Files already complete are written, the others are left alone
+            sink.close()
+            raise
+        sink.flush()
+        if cache is not None:
+            cache.save()
+
+        # Phase timings, as JSON next to the output and as a summary on stderr
+        if profiler.enabled:
+            if options['profile'] is True:
+                options['profile'] = os.path.join(os.path.dirname(options['output']), self.defaultOptions['profile_file'])
+            report = profiler.save(options['profile'])
+            print(profiler.summary(report), file=sys.stderr)
+
+    def iter_files(self, options):
+        """Yield ``(output path, markdown)`` for every file `run` would write,
+        including the `search` index, without writing them.
+
+        Takes the same options as `run`. Each file is yielded as soon as it is
+        rendered and its references are resolved, and is not kept afterwards,
+        so the output is never held in memory as a whole (single file output
+        is one file). The cache, if any, is read but not saved, except for the
+        compiled templates it keeps in their own files. Snapshots are written
+        as in `run`: to `save_snapshot`, and to `from_snapshot` when it is out
+        of date.
+        """
+        cache = self.setup(options)
+        initProfiler(options)
+        yield from self.files(options, cache)
+
+    def files(self, options, cache=None):
+        """Parse the XML once and yield ``(output path, markdown)`` for every
+        file of every target, with options already set up, then the `search`
+        index, if any."""
+        profiler = getProfiler()
+        targets = options.get('targets') or [options]
+        # Every run parses into a tree of its own
+        self.doxyparser = DoxygenParser()
+        self.doxyparser.cache = cache
+
+        # Load templates, one renderer per target
+        renderers = []
+        for target in targets:
+            r = Renderer(target)
+            r.cache = cache
+            r.register_helper(target)
+            r.load(target['template'])
+            renderers.append(r)
 
         # Parse files
-        def loadIndexCallback(err, root: Compound):
+        parsed = []
+
+        def loadIndexCallback(err, root: Compound = None):
             if err:
-                raise err
-            # Output groups
-            if options['groups']:
-                groups = root.to_array('compounds', 'group')
-                if not groups:
-                    raise ValueError("You have enabled `groups` output, but no groups were " +
-                                     "located in your doxygen XML files.")
-                group: Compound
-                for group in groups:
+                raise RuntimeError(err)
+            parsed.append(root)
+
+        self.doxyparser.load_index(options, loadIndexCallback)
+        root = parsed[0]
+
+        # Targets share the parsed tree. Each one filters it in turn and hands
+        # its documents to the batch, which renders the documents of all
+        # targets together, in parallel with `jobs`. A file is yielded once
+        # every document written into it is rendered and resolved.
+        batch = RenderBatch(options['jobs'])
+        search = None
+        outputs = []
+        # Documents still to come and the content so far, by file
+        files = {}
+
+        def resolved(rendered):
+            for index, i, contents in rendered:
+                target, paths, documents = outputs[index]
+                compound = documents[i][0]
+                if compound is root:
+                    contents.append('Generated by [pymoxygen](https://github.com/Aravind-Sundararajan/pymoxygen)')
+                filepath = helper.compound_path(compound, target)
+                file = files[filepath]
+                file[1].extend(helper.resolve_compound(compound, contents, self.doxyparser.references, target, paths))
+                file[0] -= 1
+                if not file[0]:
+                    del files[filepath]
+                    if file[1]:
+                        yield filepath, ''.join(file[1])
+
+        for index, (target, r) in enumerate(zip(targets, renderers)):
+            if index:
+                # Forget what the previous target filtered
+                for compound in [root] + root.to_array():
+                    compound.filtered = {}
+            # Work out where every reference lives once, for all written files
+            with profiler.phase('ref_paths'):
+                paths = helper.ref_paths(self.doxyparser.references, target, ParsePlan(target))
+            documents = self.documents(root, target, profiler)
+            if options.get('search') and not index:
+                # Symbols of the first target, while the tree is filtered for it
+                with profiler.phase('search'):
+                    search = SearchIndex(options['search'], paths)
+                    search.add(documents)
+            for compound, compounds in documents:
+                files.setdefault(helper.compound_path(compound, target), [0, []])[0] += 1
+            batch.add(r, [compounds for compound, compounds in documents])
+            outputs.append((target, paths, documents))
+            if options['jobs'] <= 1:
+                # Rendered from the tree, before it is filtered for the next target
+                yield from resolved(batch.results())
+        yield from resolved(batch.results())
+        if search is not None:
+            yield search.filepath, search.dumps()
+
+    def documents(self, root, options, profiler):
+        """The documents of one target, each an output compound and the
+        compounds rendered into its file, with the tree filtered for them."""
+        plan = ParsePlan(options)
+        documents = []
+        # Output groups
+        if options['groups']:
+            groups = [group for group in root.to_array('compounds', 'group') if plan.selects(group.name, 'group')]
+            if not groups:
+                raise ValueError("You have enabled `groups` output, but no groups were " +
+                                 "located in your doxygen XML files.")
+            group: Compound
+            for group in groups:
+                with profiler.phase('filter'):
                     group.filter_children(options['filters'], group.id)
-                    compounds = group.to_filtered_array('compounds')
-                    compounds.insert(0, group)  # insert group at top
-                    helper.write_compound(group, r.render_array(compounds), self.doxyparser.references, options)
-            elif options['classes']:
-                rootCompounds = root.to_array('compounds', 'namespace')
-                if not rootCompounds:
-                    raise ValueError("You have enabled `classes` output, but no classes were " +
-                                     "located in your doxygen XML files.")
-                
-                comp: Compound
-                e: Compound
-                for comp in rootCompounds:
+                compounds = group.to_filtered_array('compounds')
+                compounds.insert(0, group)  # insert group at top
+                documents.append((group, compounds))
+        elif options['classes']:
+            rootCompounds = [namespace for namespace in root.to_array('compounds', 'namespace')
+                             if plan.selects(namespace.name, 'namespace')]
+            if not rootCompounds:
+                raise ValueError("You have enabled `classes` output, but no classes were " +
+                                 "located in your doxygen XML files.")
+
+            comp: Compound
+            e: Compound
+            for comp in rootCompounds:
+                with profiler.phase('filter'):
                     comp.filter_children(options['filters'])
-                    compounds = comp.to_filtered_array()
-                    helper.write_compound(comp, [r.render_array(compounds)], self.doxyparser.references, options)
-                    for e in compounds:
-                        e.filter_children(options['filters'])
-                        compounds = e.to_filtered_array()
-                        helper.write_compound(e, [r.render_array(compounds)], self.doxyparser.references, options)
-            # Output single file
-            else:
+                documents.append((comp, [comp]))
+                for e in comp.to_filtered_array():
+                    if e.kind != 'namespace':  # nested namespaces are documents of their own
+                        documents.append((e, [e]))
+        # Output single file, with the generator note added after rendering
+        else:
+            with profiler.phase('filter'):
                 root.filter_children(options['filters'])
-                compounds = root.to_filtered_array('compounds')
-                if not options.get('noindex'):
-                    compounds.insert(0, root)  # insert root at top if index is enabled
-                contents = r.render_array(compounds)
-                if contents is not None:
-                    contents.append('Generated by [pymoxygen](https://github.com/Aravind-Sundararajan/pymoxygen)')
+                root.filtered['compounds'] = [compound for compound in root.filtered['compounds']
+                                              if plan.selects(compound.name, compound.kind)]
+            compounds = root.to_filtered_array('compounds')
+            if not options.get('noindex'):
+                compounds.insert(0, root)  # insert root at top if index is enabled
+            documents.append((root, compounds))
+
+        if options['pages']:
+            pages = root.to_array('compounds', 'page')
+            if not pages:
+                raise ValueError("You have enabled `pages` output, but no pages were " +
+                                 "located in your doxygen XML files.")
+            page: Compound
+            for page in pages:
+                compounds = page.to_filtered_array('compounds')
+                compounds.insert(0, page)
+                documents.append((page, compounds))
+        return documents
+
+    def watch(self, options):
+        """Generate the output, then again every time the XML files change.
+
+        The XML directory is polled every `interval` seconds. A rerun waits
+        until the files have stopped changing for one interval, so a doxygen
+        run in progress is not picked up halfway. Parsed compounds, rendered
+        compounds and output file hashes are kept in a cache between runs (in
+        memory, or in the `cache` directory when one is given), so a rerun only
+        parses the XML files that changed, renders the compounds that changed
+        and writes the files whose content changed. Runs until interrupted.
+        """
+        cache = self.setup(options) or Cache(None)
+        log = getLogger()
+        interval = options.get('interval') or self.defaultOptions['interval']
+        sources = None
+        try:
+            while True:
+                if sources is not None:
+                    time.sleep(interval)
+                    current = source_fingerprint(options['directory'])
+                    if current == sources:
+                        continue
+                    # Wait for doxygen to finish writing
+                    while True:
+                        time.sleep(interval)
+                        sources, current = current, source_fingerprint(options['directory'])
+                        if current == sources:
+                            break
+                sources = source_fingerprint(options['directory'])
+                start = time.perf_counter()
+                try:
+                    self.generate(options, cache)
+                except (RuntimeError, ValueError, OSError) as err:
+                    log.error('Generation failed: %s', err)
                 else:
-                    contents = ""
-                print(contents)
-                helper.write_compound(root, contents, self.doxyparser.references, options)
-
-            if options['pages']:
-                pages = root.to_array('compounds', 'page')
-                if not pages:
-                    raise ValueError("You have enabled `pages` output, but no pages were " +
-                                     "located in your doxygen XML files.")
-                page: Compound
-                for page in pages:
-                    compounds = page.to_filtered_array('compounds')
-                    compounds.insert(0, page)
-                    helper.write_compound(page, r.render_array(compounds), self.doxyparser.references, options)
+                    if not options.get('quiet'):
+                        print('Generated in {:.0f} ms, watching {}'.format((time.perf_counter() - start) * 1000,
+                                                                           options['directory']), file=sys.stderr)
+                cache.rotate()
+        except KeyboardInterrupt:
+            pass
 
-        self.doxyparser.load_index(options, loadIndexCallback)
+
+def parse_target(spec):
+    """Options of an output target given as ``key=value,key,...`` on the command line."""
+    target = {}
+    for item in spec.split(','):
+        key, sep, value = item.partition('=')
+        key = key.strip().replace('-', '_')
+        if not key:
+            continue
+        target[key] = value.split() if key == 'only' else (value if sep else True)
+    return target
 
 
 def main():
     parser = argparse.ArgumentParser(description="Doxygen converter for xml to markdown")
     parser.add_argument('-V', '--version',                  help="output the version number")
-    parser.add_argument('-d', '--directory',default="C:\\pymoxygen\\example\\xml",    help="output file, must contain ""%s"" when using `groups` or `classes`")
+    parser.add_argument('-d', '--directory',default="C:\\pymoxygen\\example\\xml",    help="doxygen XML directory, a zip or tar archive of it, or the single XML file written by combine.xslt")
     parser.add_argument('-o', '--output',default="./doc/readme.md",    help="output file, must contain ""%s"" when using `groups` or `classes`")
     parser.add_argument('-g', '--groups',           help="output doxygen groups into separate files")
     parser.add_argument('-c', '--classes',          help="output doxygen classes into separate files")
@@ -160,12 +390,38 @@ def main():
     parser.add_argument('-l', '--language',         help="programming language")
     parser.add_argument('-t', '--templates',        help="custom templates directory")
     parser.add_argument('-L', '--logfile',          help="output log messages to file")
-    parser.add_argument('-q', '--quiet',            help="quiet mode")
+    parser.add_argument('-q', '--quiet', action='store_true', help="quiet mode, only log errors")
+    parser.add_argument('-v', '--verbose', action='count', help="log progress, twice to also log every compound and member")
     parser.add_argument('-f', '--filters',            help="filters")
+    parser.add_argument('--only', nargs='+', metavar='NAME', help="only output these namespaces (groups with `groups`) "
+                                                                  "and what they contain, skipping the XML of everything else")
+    parser.add_argument('--xml-parser', choices=('etree', 'lxml'), help="XML parser backend, lxml needs the lxml package")
+    parser.add_argument('-T', '--target', dest='targets', action='append', type=parse_target, metavar='SPEC',
+                        help="also write this output from the same parse, as comma separated option=value pairs "
+                             "(e.g. ""output=api_%%s.md,classes,templates=tpl""), may be repeated")
+    parser.add_argument('-j', '--jobs', type=int,     help="number of processes used to parse the compound XML files and render the output files")
+    parser.add_argument('-s', '--search-index', dest='search', nargs='?', const=True,
+                        help="also write a JSON index of the documented symbols to this file, for client-side search")
+    parser.add_argument('-u', '--skip-unchanged', action='store_true', help="do not rewrite output files whose content did not change")
+    parser.add_argument('-C', '--cache', nargs='?', const=True, help="reuse parsed and rendered compounds from this cache directory between runs")
+    parser.add_argument('--no-native', dest='native', action='store_false', help="render the built-in templates with pybars instead of their native renderer")
+    parser.add_argument('-S', '--save-snapshot', help="save the parsed XML to this snapshot file")
+    parser.add_argument('-F', '--from-snapshot', help="load the parsed XML from this snapshot file instead of parsing, "
+                                                      "or parse and save it there when the XML changed")
+    parser.add_argument('-w', '--watch', action='store_true', help="keep running and regenerate the output when the XML files change")
+    parser.add_argument('--interval', type=float, help="seconds between checks for changed XML files in watch mode")
+    parser.add_argument('-P', '--profile', nargs='?', const=True, help="time each phase of the run and write a JSON report to this file")
+    parser.add_argument('--profile-top', type=int, help="number of slowest compounds listed in the profile report")
     args = parser.parse_args()
     options = vars(args)
+    if options['targets']:
+        # The output given by the other options is the first target
+        options['targets'].insert(0, {})
     m = Moxygen()
-    m.run(options)
+    if options.get('watch'):
+        m.watch(options)
+    else:
+        m.run(options)
     
 
 if __name__ == '__main__':
@@ -0,0 +1,148 @@
+import hashlib
+import marshal
+import os
+import pickle
+
+from moxygen.compound import Deferred
+from moxygen.hierarchy import FIELDS as HIERARCHY_FIELDS
+from moxygen.logger import getLogger
+
+
+def fingerprint(*values):
+    return hashlib.sha1(pickle.dumps(values, pickle.HIGHEST_PROTOCOL)).hexdigest()
+
+
+def fields(item, reads=()):
+    # Plain values a template can read from a compound or member; references to
+    # other compounds (parent, compounds, filtered) are left out, and so are the
+    # hierarchy fields the template does not read, as computing them reads the
+    # members of every base class.
+    values = []
+    for key, value in item.plain().items():
+        if key in HIERARCHY_FIELDS and key not in reads:
+            continue
+        if isinstance(value, Deferred):
+            value = item[key]
+        if key in ('basecompoundref', 'enumvalue') + HIERARCHY_FIELDS or \
+                isinstance(value, (str, int, float, bool, type(None))):
+            values.append((key, value))
+    return sorted(values)
+
+
+class Cache:
+    """Incremental regeneration cache.
+
+    Keeps the compiled code of every template, the parsed form of every
+    compound XML file keyed on a hash of its content, the rendered markdown of
+    every compound keyed on a fingerprint of what its template reads, and a
+    hash of every written file. Entries not used during a run are dropped when
+    the cache is saved; compiled templates are kept in their own files.
+    """
+
+    VERSION = 4
+
+    def __init__(self, directory):
+        # Without a directory the cache only lives in memory, see `rotate`
+        self.directory = directory
+        self.filename = os.path.join(directory, 'cache.pickle') if directory else None
+        self.log = getLogger()
+        self.compounds = {}
+        self.rendered = {}
+        self.outputs = {}
+        self.used = {'compounds': {}, 'rendered': {}, 'outputs': {}}
+        # Content digests by file name, valid while the size and mtime match
+        self.stats = {}
+
+    def load(self):
+        if self.filename is None:
+            return
+        try:
+            with open(self.filename, 'rb') as file:
+                data = pickle.load(file)
+        except (IOError, EOFError, pickle.UnpicklingError) as err:
+            self.log.info('Not using cache: %s', err)
+            return
+        if data.get('version') != self.VERSION:
+            return
+        self.compounds = data['compounds']
+        self.rendered = data['rendered']
+        self.outputs = data['outputs']
+
+    def save(self):
+        if self.filename is None:
+            return
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        data = dict(self.used, version=self.VERSION)
+        with open(self.filename + '.tmp', 'wb') as file:
+            pickle.dump(data, file, pickle.HIGHEST_PROTOCOL)
+        os.replace(self.filename + '.tmp', self.filename)
+
+    def rotate(self):
+        """Start a new run in this process with the entries used by the last one."""
+        self.compounds = self.used['compounds']
+        self.rendered = self.used['rendered']
+        self.outputs = self.used['outputs']
+        self.used = {'compounds': {}, 'rendered': {}, 'outputs': {}}
+
+    # Compiled templates, one marshal file each so they load without the rest
+    def get_template(self, key):
+        if self.directory is None:
+            return None
+        try:
+            with open(os.path.join(self.directory, 'templates', key + '.marshal'), 'rb') as file:
+                return marshal.load(file)
+        except (IOError, EOFError, ValueError, TypeError):
+            return None
+
+    def set_template(self, key, code):
+        if self.directory is None:
+            return
+        filename = os.path.join(self.directory, 'templates', key + '.marshal')
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename + '.tmp', 'wb') as file:
+            marshal.dump(code, file)
+        os.replace(filename + '.tmp', filename)
+
+    # Parsed compounds
+    def digest(self, filename):
+        stat = os.stat(filename)
+        entry = self.stats.get(filename)
+        if entry is not None and entry[0] == (stat.st_size, stat.st_mtime_ns):
+            return entry[1]
+        with open(filename, 'rb') as file:
+            digest = hashlib.sha1(file.read()).hexdigest()
+        self.stats[filename] = ((stat.st_size, stat.st_mtime_ns), digest)
+        return digest
+
+    def get_compound(self, filename, digest):
+        entry = self.compounds.get(filename)
+        if entry is not None and entry[0] == digest:
+            self.used['compounds'][filename] = entry
+            return entry[1]
+        return None
+
+    def set_compound(self, filename, digest, compound_def):
+        self.used['compounds'][filename] = (digest, compound_def)
+
+    # Rendered compounds
+    def render_key(self, template, source, compound, reads=()):
+        # `reads` are the hierarchy fields the template reads
+        filtered = compound.filtered
+        return fingerprint(template, source, fields(compound, reads),
+                           [fields(item, reads) for item in filtered.get('compounds', [])],
+                           [fields(item, reads) for item in filtered.get('members', [])])
+
+    def get_rendered(self, key):
+        result = self.rendered.get(key)
+        if result is not None:
+            self.used['rendered'][key] = result
+        return result
+
+    def set_rendered(self, key, result):
+        self.used['rendered'][key] = result
+
+    # Written files
+    def unchanged(self, filepath, contents):
+        digest = hashlib.sha1(contents.encode('utf-8')).hexdigest()
+        self.used['outputs'][filepath] = digest
+        return self.outputs.get(filepath) == digest and os.path.exists(filepath)
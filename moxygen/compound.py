@@ -1,48 +1,271 @@
-from itertools import chain
+import sys
 
+# Attribute values repeated all over the tree; interning them stores each once
+INTERNED = frozenset(('kind', 'section', 'prot', 'static', 'const', 'explicit', 'inline', 'virt',
+                      'mutable', 'language', 'final', 'sealed', 'abstract'))
 
-class Compound:
-    def __init__(self, parent=None, id='', name=''):
+
+class Deferred:
+    """A field value computed when it is first read, see `Node.__getattr__`."""
+    __slots__ = ()
+
+    def resolve(self):
+        raise NotImplementedError
+
+
+class Node:
+    """Base of the slotted tree objects.
+
+    Known fields are slots; any other attribute read from the XML is kept in
+    ``attrib``, which is only allocated once such an attribute is set. Nodes
+    support both attribute and item access (``node.kind``, ``node['kind']``)
+    so templates and helpers can treat them like dicts.
+
+    A field set to a `Deferred` value is kept in ``deferred`` and its slot left
+    empty; the value is resolved and stored in the slot on first access, so
+    fields nobody reads are never computed.
+    """
+    __slots__ = ('attrib', 'deferred')
+
+    def __getattr__(self, key):
+        # Only called for names that are not slots or whose slot is empty
+        if key == 'attrib' or key == 'deferred':
+            raise AttributeError(key)
+        if self.deferred is not None and key in self.deferred:
+            value = self.deferred.pop(key).resolve()
+            self[key] = value
+            return value
+        if self.attrib is not None and key in self.attrib:
+            return self.attrib[key]
+        raise AttributeError(key)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if isinstance(value, Deferred):
+            self.defer(key, value)
+            return
+        if key in INTERNED and type(value) is str:
+            value = sys.intern(value)
+        if self.deferred is not None:
+            self.deferred.pop(key, None)
+        if key in self.fields:
+            object.__setattr__(self, key, value)
+        elif self.attrib is None:
+            self.attrib = {key: value}
+        else:
+            self.attrib[key] = value
+
+    def defer(self, key, value):
+        if self.deferred is None:
+            self.deferred = {}
+        self.deferred[key] = value
+        if key in self.fields:
+            try:
+                object.__delattr__(self, key)
+            except AttributeError:
+                pass
+        elif self.attrib is not None:
+            self.attrib.pop(key, None)
+
+    def get(self, key, default=None):
+        value = getattr(self, key, None)
+        return default if value is None else value
+
+    def keys(self):
+        # Resolve deferred values first, into their slot or into attrib
+        for key in list(self.deferred or ()):
+            getattr(self, key)
+        return [key for key in self.__slots__ if getattr(self, key) is not None] + list(self.attrib or ())
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.keys()]
+
+    def update(self, values):
+        for key in values:
+            self[key] = values[key]
+
+    def plain(self):
+        # Fields that do not refer to other nodes of the tree, deferred ones
+        # still unresolved
+        values = {key: value for key, value in self.__getstate__().items()
+                  if value is not None and key not in ('attrib', 'deferred', 'parent', 'compounds', 'members',
+                                                       'filtered', 'kinds', 'sections', 'groups')}
+        values.update(self.attrib or ())
+        values.update(self.deferred or ())
+        return values
+
+    # Pickled from the slots directly, so deferred fields stay deferred
+    def __getstate__(self):
+        state = {}
+        for key in self.__slots__ + Node.__slots__:
+            try:
+                state[key] = object.__getattribute__(self, key)
+            except AttributeError:
+                pass
+        return state
+
+    def __setstate__(self, state):
+        for key, value in state.items():
+            object.__setattr__(self, key, value)
+
+
+class Member(Node):
+    __slots__ = ('refid', 'kind', 'name', 'parent', 'section', 'briefdescription', 'detaileddescription',
+                 'summary', 'proto', 'enumvalue', 'groupid', 'groupname')
+    fields = frozenset(__slots__)
+
+    def __init__(self, parent, attrib):
+        self.attrib = self.deferred = None
+        self.refid = self.kind = self.name = self.section = None
+        self.briefdescription = self.detaileddescription = self.summary = self.proto = None
+        self.enumvalue = self.groupid = self.groupname = None
         self.parent = parent
-        self.kind = "dir"
+        self.update(attrib)
+
+    def detach(self):
+        """Copy of this member without its parent, cheap to send to another process."""
+        return Member(None, self.plain())
+
+
+class Compound(Node):
+    __slots__ = ('parent', 'kind', 'id', 'refid', 'name', 'compounds', 'members', 'basecompoundref', 'filtered',
+                 'briefdescription', 'detaileddescription', 'summary', 'proto', 'namespace', 'groupid',
+                 'groupname', 'innernamespaces', 'kinds', 'sections', 'groups')
+    fields = frozenset(__slots__)
+
+    def __init__(self, parent=None, id='', name='', kind='dir'):
+        self.attrib = self.deferred = None
+        self.parent = parent
+        self.kind = kind
         self.id = id
         self.name = name
         self.compounds = {}
         self.members = []
         self.basecompoundref = []
         self.filtered = {}
+        self.refid = self.briefdescription = self.detaileddescription = self.summary = self.proto = None
+        self.namespace = self.groupid = self.groupname = self.innernamespaces = None
+        # Indexes kept up to date as the tree changes, so queries cost O(result):
+        # child compounds by kind, members by section and members by group id
+        # and section. Buckets are dicts keyed by object id to allow removal.
+        self.kinds = {}
+        self.sections = {}
+        self.groups = {}
 
-    def find(self, id, name, create=False):
-        compound = self.compounds.get(id)
-        if not compound and create:
-            compound = Compound(self, id, name)
-            self.compounds[id] = compound
+    def __setitem__(self, key, value):
+        if key == 'kind' and value != self.kind and self.parent is not None and self.id in self.parent.compounds:
+            self.parent.remove_compound(self)
+            Node.__setitem__(self, key, value)
+            self.parent.add_compound(self)
+        else:
+            Node.__setitem__(self, key, value)
+
+    def detach(self, deep=True, reads=()):
+        """Copy of what a template reads from this compound, detached from the tree.
+
+        The copy holds this compound's fields and, when `deep`, detached copies
+        of its filtered members and compounds, so it can be pickled to a worker
+        process without taking the rest of the tree along. Child compounds are
+        only kept as placeholders with their kind, for `Renderer.template_name`.
+        Deferred fields not computed yet are left out, unless they are in
+        `reads`, the fields the template reads, which are computed here.
+        """
+        compound = Compound(None, self.id, self.name, self.kind)
+        for key, value in self.plain().items():
+            if isinstance(value, Deferred):
+                if key not in reads:
+                    continue
+                value = self[key]
+            compound[key] = value
+        if deep:
+            for child in self.compounds.values():
+                compound.compounds[child.id] = Compound(None, child.id, child.name, child.kind)
+            compound.filtered = {type_: [item.detach(False, reads) if type_ == 'compounds' else item.detach()
+                                         for item in items]
+                                 for type_, items in self.filtered.items()}
         return compound
 
-    def to_array(self, type_='compounds', kind=None):
-        if type_ == 'compounds':
-            arr = list(self.compounds.values())
-        else:
-            arr = self.members
+    def add_compound(self, compound):
+        self.compounds[compound.id] = compound
+        self.kinds.setdefault(compound.kind, {})[id(compound)] = compound
 
-        if kind:
-            arr = [compound for compound in arr if compound.kind == kind]
+    def remove_compound(self, compound):
+        del self.compounds[compound.id]
+        self.kinds[compound.kind].pop(id(compound), None)
 
-        all_arr = []
-        for compound in arr:
-            this_arr = compound.to_array(type_, kind)
-            all_arr.append(this_arr)
+    def add_member(self, member):
+        self.members.append(member)
+        self.index_member(member)
 
-        if not all_arr:  # Base case: No members, return itself as a single-element list.
-            return [self]
+    def index_member(self, member):
+        if member.section is not None:
+            self.sections.setdefault(member.section, {})[id(member)] = member
+            if member.groupid:
+                self.groups.setdefault(member.groupid, {}).setdefault(member.section, {})[id(member)] = member
 
-        return list(chain.from_iterable(all_arr))
+    def unindex_member(self, member):
+        if member.section is not None:
+            self.sections[member.section].pop(id(member), None)
+            if member.groupid:
+                self.groups[member.groupid][member.section].pop(id(member), None)
+
+    def update_member(self, member, values):
+        self.unindex_member(member)
+        member.update(values)
+        self.index_member(member)
+
+    def reindex(self, seen=None):
+        """Rebuild the indexes of this compound and its descendants.
+
+        The index buckets are keyed by object id, so they have to be rebuilt
+        when the tree is loaded back from a snapshot.
+        """
+        seen = set() if seen is None else seen
+        if id(self) in seen:
+            return
+        seen.add(id(self))
+        self.kinds = {}
+        self.sections = {}
+        self.groups = {}
+        for compound in self.compounds.values():
+            self.kinds.setdefault(compound.kind, {})[id(compound)] = compound
+            compound.reindex(seen)
+        for member in self.members:
+            self.index_member(member)
+
+    def find(self, id, name, create=False, kind='dir'):
+        compound = self.compounds.get(id)
+        if not compound and create:
+            compound = Compound(self, id, name, kind)
+            self.add_compound(compound)
+        return compound
+
+    def to_array(self, type_='compounds', kind=None):
+        """All descendants in pre-order, optionally only through compounds of `kind`."""
+        if type_ != 'compounds':
+            return [member for member in self.members if not kind or member.kind == kind]
+        arr = []
+        self.collect(arr, kind)
+        return arr
+
+    def collect(self, arr, kind=None):
+        children = self.kinds.get(kind, {}).values() if kind else self.compounds.values()
+        for compound in children:
+            arr.append(compound)
+            compound.collect(arr, kind)
 
     def to_filtered_array(self, type_='compounds'):
-        all_arr = []
-        if type_ == 'compounds':
-            all_arr = self.to_array()
-        return all_arr
+        arr = []
+        for item in self.filtered.get(type_, []):
+            arr.append(item)
+            if type_ == 'compounds':
+                arr.extend(item.to_filtered_array(type_))
+        return arr
 
     def filter_children(self, filters, groupid=None):
         member_filter = {}
@@ -51,8 +274,10 @@ class Compound:
         if filters is not None:
             member_filter = filters['members']
             compound_filter = filters['compounds']
+        # Descendants are filtered before their ancestors, so a namespace is
+        # never skipped by its parent for not having been filtered yet.
         compounds = self.to_array()
-        for compound in compounds:
+        for compound in reversed(compounds):
             compound.filtered['members'] = compound.filter(compound.members, 'section', member_filter, groupid)
             compound.filtered['compounds'] = compound.filter(compound.compounds, 'kind', compound_filter, groupid)
 
@@ -60,6 +285,15 @@ class Compound:
         self.filtered['compounds'] = self.filter(self.compounds, 'kind', compound_filter, groupid)
 
     def filter(self, collections, key, filters, groupid=None):
+        # Own members and child compounds are looked up in the indexes
+        if collections is self.members and key == 'section':
+            index = self.groups.get(groupid, {}) if groupid else self.sections
+            return [member for category in filters for member in index.get(category, {}).values()]
+        if collections is self.compounds and key == 'kind':
+            return [item for category in filters for item in self.kinds.get(category, {}).values()
+                    if not (item.kind == 'namespace' and 'compounds' not in item.filtered and 'members' not in item.filtered)
+                    and not (groupid and item.groupid != groupid)]
+
         categories = {}
         result = []
         if type(collections) == list:
@@ -67,9 +301,9 @@ class Compound:
                 if item['kind'] == 'namespace' and 'compounds' not in item['filtered'] and 'members' not in item['filtered']:
                     continue
 
-                if groupid and item[groupid] != groupid:
+                if groupid and item['groupid'] != groupid:
                     continue
-                if key in list(item.keys()):
+                if item.get(key) is not None:
                     if item[key] not in categories:
                         categories[item[key]] = []
 
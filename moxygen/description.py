@@ -0,0 +1,168 @@
+class DescriptionRenderer:
+    """Convert doxygen description markup (``ET.Element`` trees) to markdown.
+
+    Elements are rendered in a single pass: each tag is dispatched through the
+    ``handlers`` table and output is appended to one list that is joined once at
+    the end. Handlers that rewrite their content (links, table cells) render
+    it into a temporary list first.
+    """
+
+    def __init__(self, parser):
+        self.parser = parser
+        self.unsupported = set()
+
+    def render(self, element):
+        if element is None:
+            return ''
+        if isinstance(element, str):
+            return element
+        out = []
+        self.visit(element, out, [])
+        return ''.join(out)
+
+    def visit(self, element, out, context):
+        handler = self.handlers.get(element.tag)
+        if handler is None:
+            if element.tag not in self.unsupported:
+                self.unsupported.add(element.tag)
+                self.parser.log.debug('%s: not yet supported.', element.tag)
+            handler = DescriptionRenderer.children
+        handler(self, element, out, context)
+
+    def children(self, element, out, context):
+        if element.text:
+            out.append(element.text)
+        for child in element:
+            self.visit(child, out, context)
+            if child.tail:
+                out.append(child.tail)
+
+    def content(self, element, context):
+        out = []
+        self.children(element, out, context)
+        return ''.join(out)
+
+    def wrap(prefix, suffix=''):
+        def handler(self, element, out, context):
+            out.append(prefix)
+            self.children(element, out, context)
+            out.append(suffix)
+        return handler
+
+    def text(value):
+        def handler(self, element, out, context):
+            out.append(value)
+        return handler
+
+    def ref(self, element, out, context):
+        out.append(self.parser.ref_link(self.content(element, context), element.get('refid')))
+
+    def ulink(self, element, out, context):
+        out.append(self.parser.link(self.content(element, context), element.get('url')))
+
+    def parameterlist(self, element, out, context):
+        if element.get('kind') == 'exception':
+            out.append('\n#### Exceptions\n')
+        else:
+            out.append('\n#### Parameters\n')
+        self.children(element, out, context)
+        out.append('\n\n')
+
+    def listing(self, element, out, context):
+        context.append(element.tag)
+        out.append('\n\n')
+        self.children(element, out, context)
+        out.append('\n')
+        context.pop()
+
+    def listitem(self, element, out, context):
+        out.append('1. ' if context and context[-1] == 'orderedlist' else '* ')
+        self.children(element, out, context)
+        out.append('\n')
+
+    def simplesect(self, element, out, context):
+        kind = element.get('kind')
+        if kind == 'attention':
+            out.append('> ')
+        elif kind == 'return':
+            out.append('\n#### Returns\n')
+        elif kind == 'see':
+            out.append('**See also**: ')
+        else:
+            self.parser.log.debug('%s not supported.', kind)
+        self.children(element, out, context)
+
+    def formula(self, element, out, context):
+        s = self.parser.trim(element.text or '')
+        if s.startswith('$') and s.endswith('$'):
+            out.append(s)
+            return
+        if s.startswith('\\[') and s.endswith('\\]'):
+            s = self.parser.trim(s[2:-2])
+        out.append('\n$$\n' + s + '\n$$\n')
+
+    def sect(self, element, out, context):
+        context.append(element.tag)
+        out.append('\n' + self.parser.get_anchor(element.get('id')) + '\n')
+        self.children(element, out, context)
+        out.append('\n')
+        context.pop()
+
+    def title(self, element, out, context):
+        level = ''
+        if context and context[-1].startswith('sect'):
+            level = '#' * int(context[-1][4:])
+        out.append('\n#{} {}\n'.format(level, self.content(element, context)))
+
+    def table(self, element, out, context):
+        out.append('\n')
+        self.children(element, out, context)
+        out.append('\n')
+
+    def row(self, element, out, context):
+        out.append('\n' + self.parser.escape_row(self.content(element, context)))
+        entries = element.findall('entry')
+        if entries and entries[0].get('thead') == 'yes':
+            for i in range(len(entries)):
+                out.append(' | ---------' if i else '\n---------')
+
+    def entry(self, element, out, context):
+        out.append(self.parser.escape_cell(self.content(element, context)) + '|')
+
+    handlers = {
+        'ref': ref,
+        'ulink': ulink,
+        'emphasis': wrap('*', '*'),
+        'bold': wrap('**', '**'),
+        'computeroutput': wrap('`', '`'),
+        'parametername': wrap('`', '` '),
+        'parameterlist': parameterlist,
+        'parameteritem': wrap('* ', '\n'),
+        'programlisting': wrap('\n```cpp\n', '```\n'),
+        'codeline': wrap('', '\n'),
+        'orderedlist': listing,
+        'itemizedlist': listing,
+        'listitem': listitem,
+        'sp': text(' '),
+        'heading': wrap('## '),
+        'xrefsect': wrap('\n> '),
+        'xreftitle': wrap('', ': '),
+        'simplesect': simplesect,
+        'formula': formula,
+        'preformatted': wrap('\n<pre>', '</pre>\n'),
+        'title': title,
+        'mdash': text('&mdash;'),
+        'ndash': text('&ndash;'),
+        'linebreak': text('<br/>'),
+        'para': wrap('', '\n\n'),
+        'table': table,
+        'row': row,
+        'entry': entry,
+    }
+    handlers.update(dict.fromkeys(('sect1', 'sect2', 'sect3', 'sect4', 'sect5', 'sect6'), sect))
+    handlers.update(dict.fromkeys((
+        'briefdescription', 'detaileddescription', 'inbodydescription', 'description', 'internal',
+        'type', 'declname', 'defname', 'highlight', 'parameterdescription', 'parameternamelist',
+        'xrefdescription', 'verbatim', 'hruler'), children))
+
+    del wrap, text
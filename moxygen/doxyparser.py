@@ -1,9 +1,20 @@
 import os
+import pickle
+import posixpath
 import re
+import time
 import xml.etree.ElementTree as ET
-
-from moxygen.compound import Compound
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import repeat
+
+from moxygen import ingest
+from moxygen.compound import Compound, Deferred, Member
+from moxygen.description import DescriptionRenderer
+from moxygen.hierarchy import Hierarchy
 from moxygen.logger import getLogger
+from moxygen.plan import ParsePlan
+from moxygen.profile import getProfiler
 
 
 class DoxygenParser:
@@ -11,131 +22,17 @@ class DoxygenParser:
         self.references = {}
         self.root = Compound()
         self.log = getLogger()
-
-    def to_markdown(self, element, context=None):
-        s = ''
-        context = context or []
-        if isinstance(element, str):
-            s = element
-        elif isinstance(element, dict):
-            element_name = element.get('#name', '')
-            if isinstance(element_name, list):
-                element_name = element_name[0]
-
-            if element_name == 'ref':
-                s += self.ref_link(self.to_markdown(element['$$']), element['$']['refid'])
-            elif element_name == '__text__':
-                s = element['_']
-            elif element_name in ('emphasis', 'bold', 'parametername', 'computeroutput'):
-                s = '*' if element_name == 'emphasis' else '**' if element_name == 'bold' else '`'
-            elif element_name == 'parameterlist':
-                if element['$']['kind'] == 'exception':
-                    s = '\n#### Exceptions\n'
-                else:
-                    s = '\n#### Parameters\n'
-            elif element_name == 'parameteritem':
-                s = '* '
-            elif element_name == 'programlisting':
-                s = '\n```cpp\n'
-            elif element_name == 'orderedlist':
-                context.append(element)
-                s = '\n\n'
-            elif element_name == 'itemizedlist':
-                s = '\n\n'
-            elif element_name == 'listitem':
-                s = '1. ' if context and context[-1].get('#name') == 'orderedlist' else '* '
-            elif element_name == 'sp':
-                s = ' '
-            elif element_name == 'heading':
-                s = '## '
-            elif element_name == 'xrefsect':
-                s += '\n> '
-            elif element_name == 'simplesect':
-                if element['$']['kind'] == 'attention':
-                    s = '> '
-                elif element['$']['kind'] == 'return':
-                    s = '\n#### Returns\n'
-                elif element['$']['kind'] == 'see':
-                    s = '**See also**: '
-                else:
-                    self.log.info(element['$']['kind'] + ' not supported.')
-            elif element_name == 'formula':
-                s = self.trim(element['_'])
-                if s.startswith('$') and s.endswith('$'):
-                    return s
-                if s.startswith('\\[') and s.endswith('\\]'):
-                    s = self.trim(s[2:-2])
-                return '\n$$\n' + s + '\n$$\n'
-            elif element_name == 'preformatted':
-                s = '\n<pre>'
-            elif element_name.startswith('sect'):
-                context.append(element)
-                s = '\n' + self.get_anchor(element['$']['id']) + '\n'
-            elif element_name == 'title':
-                level = '#' * int(context[-1]['#name'][-1])
-                s = '\n{} {} {}\n'.format('#', level, element['_'])
-            elif element_name == 'mdash':
-                s = '&mdash;'
-            elif element_name == 'ndash':
-                s = '&ndash;'
-            elif element_name == 'linebreak':
-                s = '<br/>'
-            elif element_name in ('xreftitle', 'entry', 'row', 'ulink', 'codeline', 'highlight', 'table', 'para', 
-                                  'parameterdescription', 'parameternamelist', 'xrefdescription', 'verbatim', 'hruler', None):
-                pass
-            else:
-                self.log.info(element_name + ': not yet supported.')
-
-            if element.get('$$'):
-                s += self.to_markdown(element['$$'], context)
-
-            if element_name in ('parameterlist', 'para'):
-                s += '\n\n'
-            elif element_name == 'emphasis':
-                s += '*'
-            elif element_name == 'bold':
-                s += '**'
-            elif element_name == 'parameteritem':
-                s += '\n'
-            elif element_name == 'computeroutput':
-                s += '`'
-            elif element_name == 'parametername':
-                s += '` '
-            elif element_name == 'entry':
-                s = self.escape_cell(s) + '|'
-            elif element_name == 'programlisting':
-                s += '```\n'
-            elif element_name == 'codeline':
-                s += '\n'
-            elif element_name == 'ulink':
-                s = self.link(s, element['$']['url'])
-            elif element_name == 'orderedlist':
-                context.pop()
-                s += '\n'
-            elif element_name == 'itemizedlist':
-                s += '\n'
-            elif element_name == 'listitem':
-                s += '\n'
-            elif element_name == 'entry':
-                s = ' | '
-            elif element_name == 'xreftitle':
-                s += ': '
-            elif element_name == 'preformatted':
-                s += '</pre>\n'
-            elif element_name.startswith('sect'):
-                context.pop()
-                s += '\n'
-            elif element_name == 'row':
-                s = '\n' + self.escape_row(s)
-                if element.get('$$') and element['$$'][0]['$']['thead'] == 'yes':
-                    for i, th in enumerate(element['$$']):
-                        s += ('\n' + ' | '.join(['---------'] if i > 0 else ['', '---------']))[0]
-            elif element_name == 'compounddef':
-                pass
-            else:
-                self.log.info(element_name + ': not yet supported.')
-
-        return s
+        self.cache = None
+        self.plan = ParsePlan({})
+        # XML parser backend, see `ingest.iterparse`
+        self.xml_parser = None
+        # Class hierarchy, built once the tree is complete
+        self.hierarchy = None
+        self.description = DescriptionRenderer(self)
+
+    def to_markdown(self, element):
+        with getProfiler().phase('to_markdown'):
+            return self.description.render(element)
 
     def ref_link(self, text, refid):
         return self.link(text, '{{#ref {} #}}'.format(refid))
@@ -158,56 +55,46 @@ class DoxygenParser:
         return re.sub(r'^[\s\t\r\n]+|[\s\t\r\n]+$', '', text)
 
     def copy(self, dest, prop, def_val):
-        if prop in def_val.keys():
-            dest.__setattr__(prop, self.trim(self.to_markdown(def_val.get(prop))))
-        else:
-            try:
-                dest[prop] = self.trim(self.to_markdown(""))
-            except Exception:
-                dest.__setattr__(prop, self.trim(self.to_markdown("")))
+        dest[prop] = self.trim(self.to_markdown(def_val.find(prop)))
 
-    def summary(self, dest, def_val):
-        summary = self.trim(self.to_markdown(def_val.get('briefdescription', '')))
+    def summary(self, dest):
+        # Uses the descriptions already copied into dest
+        summary = dest['briefdescription']
         if not summary:
-            summary = self.trim(self.to_markdown(def_val.get('detaileddescription', '')))
+            summary = dest['detaileddescription']
             if summary:
                 first_sentence = summary.split('\n', 1)[0]
                 if first_sentence:
                     summary = first_sentence
-        try:
-            dest.__setattr__('summary', summary)
-        except Exception:
-            dest['summary'] =  summary
+        dest['summary'] = summary
 
     def parse_members(self, compound, props, members_def):
-        for prop in list(props.keys()):
-            compound.__setattr__(prop, props[prop])
+        compound.update(props)
 
         self.references[compound.refid] = compound
         if members_def:
             for member_def in members_def:
-                member = {'refid': member_def.get("refid"), 'parent': compound}
-                compound.members.append(member)
-                for prop in member_def.attrib:
-                    member[prop] = member_def.attrib[prop]
-                self.references[member["refid"]] = member
+                member = Member(compound, member_def.attrib)
+                member.name = member_def.find('name').text
+                compound.add_member(member)
+                self.references[member.refid] = member
 
-    def parse_member(self, member, section, member_def):
-        self.log.info(member)
-        self.log.info('Processing member {} {}'.format(member['kind'], member['refid']))
-        member['section'] = section
+    def read_member(self, member_def):
+        member = {}
         self.copy(member, 'briefdescription', member_def)
         self.copy(member, 'detaileddescription', member_def)
-        self.summary(member, member_def)
+        self.summary(member)
 
         m = []
-        member_kind = member['kind']
+        member_kind = member_def.attrib['kind']
+        member_name = member_def.find('name').text
+        member_refid = member_def.attrib['id']
         if member_kind in ('signal', 'slot'):
             m.extend(['{', member_kind, '} '])
 
         if member_kind == 'function':
             m.extend([member_def.attrib['prot'], ' '])  # public, private, ...
-            if member_def.find('templateparamlist'):
+            if has_children(member_def.find('templateparamlist')):
                 m.append('template<')
                 template_params = member_def.find('templateparamlist').findall('param')
                 m.extend([', ' + self.to_markdown(param.find('type')) + ' ' + self.to_markdown(param.find('declname'))
@@ -220,9 +107,9 @@ class DoxygenParser:
             m.extend(['virtual ', ' ']) if member_def.attrib.get('virt') == 'virtual' else m
             m.extend([self.to_markdown(member_def.find('type')), ' '])
             m.extend([member_def.attrib.get('explicit'), ' '] if member_def.attrib.get('explicit') else [])
-            m.extend([self.ref_link(member['refid'], member['refid']), '('])
+            m.extend([self.ref_link(member_refid, member_refid), '('])
 
-            if member_def.find('param'):
+            if has_children(member_def.find('param')):
                 params = member_def.findall('param')
                 m.extend([', ' + self.to_markdown(param.find('type')) + ' ' + self.to_markdown(param.find('declname'))
                           for param in params[1:]])
@@ -237,12 +124,12 @@ class DoxygenParser:
             m.extend(['static ', ' ']) if member_def.attrib.get('static') == 'yes' else m
             m.extend(['mutable ', ' ']) if member_def.attrib.get('mutable') == 'yes' else m
             m.extend([self.to_markdown(member_def.find('type')), ' '])
-            m.extend([self.ref_link(member['name'], member['refid'])])
+            m.extend([self.ref_link(member_name, member_refid)])
 
         elif member_kind == 'property':
             m.extend(['{', member_kind, '} '])
             m.extend([self.to_markdown(member_def.find('type')), ' '])
-            m.extend([self.ref_link(member['name'], member['refid'])])
+            m.extend([self.ref_link(member_name, member_refid)])
 
         elif member_kind == 'enum':
             member['enumvalue'] = []
@@ -251,73 +138,102 @@ class DoxygenParser:
                 self.copy(enum_value_item, 'name', enum_value)
                 self.copy(enum_value_item, 'briefdescription', enum_value)
                 self.copy(enum_value_item, 'detaileddescription', enum_value)
-                self.summary(enum_value_item, enum_value)
+                self.summary(enum_value_item)
                 member['enumvalue'].append(enum_value_item)
 
-            m.extend([member_kind, ' ', self.ref_link(member['name'], member['refid'])])
+            m.extend([member_kind, ' ', self.ref_link(member_name, member_refid)])
 
         else:
-            m.extend([member_kind, ' ', self.ref_link(member['name'], member['refid'])])
+            m.extend([member_kind, ' ', self.ref_link(member_name, member_refid)])
 
         member['proto'] = self.inline(m)
+        return member
+
+    def parse_member(self, member, section, member_def):
+        self.log.debug('Processing member %s %s', member.kind, member.refid)
+        member.parent.update_member(member, {'section': section})
+        member.update(member_def)
 
     def assign_to_namespace(self, compound, child):
         if compound.name != child['namespace']:
-            self.log.info('namespace mismatch:', compound.name, '!=', child['namespace'])
+            self.log.info('namespace mismatch: %s != %s', compound.name, child['namespace'])
         if child['parent']:
-            del child['parent']['compounds'][child['id']]
-        compound.compounds[child['id']] = child
+            child['parent'].remove_compound(child)
+        compound.add_compound(child)
         child['parent'] = compound
 
     def assign_namespace_to_group(self, compound, child):
-        compound.compounds[child['id']] = child
+        compound.add_compound(child)
         for id in child['compounds']:
             if id in compound.compounds:
-                del compound.compounds[id]
+                compound.remove_compound(compound.compounds[id])
 
     def assign_class_to_group(self, compound, child):
-        compound.compounds[child['id']] = child
+        compound.add_compound(child)
         child['groupid'] = compound.id
         child['groupname'] = compound.name
 
         for member in child['members']:
-            member['groupid'] = compound.id
-            member['groupname'] = compound.name
+            child.update_member(member, {'groupid': compound.id, 'groupname': compound.name})
 
     def extract_page_sections(self, page, elements):
         for element in elements:
             if element['#name'] in ('sect1', 'sect2', 'sect3'):
-                member = {'section': element['#name'], 'id': element['$']['id'], 'name': element['$']['id'], 'refid': element['$']['id'], 'parent': page}
-                page['members'].append(member)
+                member = Member(page, {'section': element['#name'], 'id': element['$']['id'], 'name': element['$']['id'], 'refid': element['$']['id']})
+                page.add_member(member)
                 self.references[member['refid']] = member
 
             if element.get('$$'):
                 self.extract_page_sections(page, element['$$'])
 
+    def read_compound(self, compound_def, sections):
+        """Extract everything ``parse_compound`` needs from a ``compounddef`` element.
+
+        ``sections`` holds the ``(kind, [(refid, member), ...])`` pairs already
+        read from the ``sectiondef`` elements by ``read_compound_file``. The
+        result only holds plain dicts, lists and strings so that it can be sent
+        back from a worker process when parsing in parallel.
+        """
+        data = {'attrib': dict(compound_def.attrib)}
+        self.copy(data, 'briefdescription', compound_def)
+        self.copy(data, 'detaileddescription', compound_def)
+        self.summary(data)
+
+        data['basecompoundref'] = []
+        for basecompoundref in compound_def.findall('basecompoundref'):
+            base = {'prot': basecompoundref.attrib['prot'], 'name': basecompoundref.text.strip(),
+                    'virt': basecompoundref.attrib.get('virt')}
+            # Bases outside the XML have no refid
+            if basecompoundref.attrib.get('refid'):
+                base['refid'] = basecompoundref.attrib['refid']
+            data['basecompoundref'].append(base)
+
+        data['sections'] = sections
+
+        data['pagesections'] = [{'#name': element.tag, '$': dict(element.attrib)}
+                                for element in compound_def.findall('.//sect1|.//sect2|.//sect3')]
+
+        data['innerclass'] = [innerclass_def.attrib['refid'] for innerclass_def in compound_def.findall('innerclass')]
+        data['innernamespace'] = [namespace_def.attrib['refid'] for namespace_def in compound_def.findall('innernamespace')]
+        return data
+
     def parse_compound(self, compound, compound_def):
-        for prop in compound_def.attrib:
-            compound.__setattr__(prop,compound_def.attrib[prop])
-        self.copy(compound, 'briefdescription', compound_def)
-        self.copy(compound, 'detaileddescription', compound_def)
-        self.summary(compound, compound_def)
-
-        if compound_def.find('basecompoundref'):
-            for basecompoundref in compound_def.findall('basecompoundref'):
-                compound.basecompoundref.append({'prot': basecompoundref.attrib['prot'], 'name': basecompoundref.text.strip()})
-
-        if compound_def.find('sectiondef'):
-            for section in compound_def.findall('sectiondef'):
-                members_def = section.findall('memberdef')
-                if members_def:
-                    for member_def in members_def:
-                        member = self.references[member_def.attrib['id']]
-                        if compound.kind == 'group':
-                            member['groupid'] = compound.id
-                            member['groupname'] = compound.name
-                        elif compound.kind == 'file':
-                            self.root['members'].append(member)
-
-                        self.parse_member(member, section.attrib['kind'], member_def)
+        compound.update(compound_def['attrib'])
+        compound.briefdescription = compound_def['briefdescription']
+        compound.detaileddescription = compound_def['detaileddescription']
+        compound.summary = compound_def['summary']
+
+        compound.basecompoundref.extend(compound_def['basecompoundref'])
+
+        for section, members_def in compound_def['sections']:
+            for refid, member_def in members_def:
+                member = self.references[refid]
+                if compound.kind == 'group':
+                    member.parent.update_member(member, {'groupid': compound.id, 'groupname': compound.name})
+                elif compound.kind == 'file':
+                    self.root.add_member(member)
+
+                self.parse_member(member, section, member_def)
 
         compound.__setattr__('proto', self.inline([compound.kind, ' ', self.ref_link(compound.name, compound.refid)]))
 
@@ -330,55 +246,484 @@ class DoxygenParser:
             pass
 
         elif compound.kind == 'page':
-            self.extract_page_sections(compound, compound_def.findall('.//sect1|.//sect2|.//sect3'))
+            self.extract_page_sections(compound, compound_def['pagesections'])
 
         elif compound.kind in ('namespace', 'group'):
             if compound.kind == 'group':
                 compound.groupid = compound.id
                 compound.groupname = compound.name
 
-            if compound_def.find('innerclass'):
-                for innerclass_def in compound_def.findall('innerclass'):
-                    if compound.kind == 'namespace':
-                        self.assign_to_namespace(compound, self.references[innerclass_def.attrib['refid']])
-                    elif compound.kind == 'group':
-                        self.assign_class_to_group(compound, self.references[innerclass_def.attrib['refid']])
+            for refid in compound_def['innerclass']:
+                if compound.kind == 'namespace':
+                    self.assign_to_namespace(compound, self.references[refid])
+                elif compound.kind == 'group':
+                    self.assign_class_to_group(compound, self.references[refid])
 
-            if compound_def.find('innernamespace'):
+            if compound_def['innernamespace']:
                 compound.innernamespaces = []
-                for namespace_def in compound_def.findall('innernamespace'):
-                    self.assign_namespace_to_group(compound, self.references[namespace_def.attrib['refid']])
+                for refid in compound_def['innernamespace']:
+                    self.assign_namespace_to_group(compound, self.references[refid])
+
+    def read_compound_file(self, filename, wanted=None, source=None):
+        """Stream a compound XML file, converting each ``memberdef`` as soon as
+        it is complete and dropping it from the tree afterwards, so only one
+        member is held as elements at a time.
+
+        When `wanted` lists the member sections kept by the filters, members
+        of other sections are not converted to markdown: their fields are
+        deferred and only read again from `filename` if something asks for
+        them, see `MemberSource`, or from `source` when `filename` is the
+        content of the file rather than its name.
+        """
+        sections = []
+        members = None
+        skipped = False
+        source_members = None
+        parents = []
+        for event, element in ingest.iterparse(filename, ('start', 'end'), self.xml_parser):
+            if event == 'start':
+                parents.append(element)
+                if element.tag == 'sectiondef':
+                    members = []
+                    skipped = wanted is not None and element.attrib.get('kind') not in wanted
+                continue
+
+            parents.pop()
+            if element.tag == 'memberdef':
+                if skipped:
+                    if source_members is None:
+                        source_members = MemberSource(filename if source is None else source)
+                    members.append((element.attrib['id'], source_members.fields(element.attrib['id'])))
+                else:
+                    members.append((element.attrib['id'], self.read_member(element)))
+                parents[-1].remove(element)
+            elif element.tag == 'sectiondef':
+                if members:
+                    sections.append((element.attrib['kind'], members))
+            elif element.tag == 'compounddef':
+                return self.read_compound(element, sections)
+
+    def read_members(self, filename, compounds=None):
+        """Every ``memberdef`` of a compound XML file, converted, by id.
+
+        For a combined file, `compounds` lists the compounds whose members are
+        converted, which are then keyed by ``(compound id, member id)``.
+        """
+        members = {}
+        compound = None
+        for event, element in ingest.iterparse(filename, ('start', 'end'), self.xml_parser):
+            if event == 'start':
+                if element.tag == 'compounddef':
+                    compound = element.attrib['id']
+            elif element.tag == 'memberdef':
+                if compounds is None:
+                    members[element.attrib['id']] = self.read_member(element)
+                elif compound in compounds:
+                    members[(compound, element.attrib['id'])] = self.read_member(element)
+                element.clear()
+            elif element.tag == 'compounddef':
+                element.clear()
+        return members
+
+    def iter_index(self, filename):
+        """Stream the ``compound`` elements of ``index.xml``, detaching each one
+        from the document once it has been handed out."""
+        context = ingest.iterparse(filename, ('start', 'end'), self.xml_parser)
+        _, root = next(context)
+        for event, element in context:
+            if event == 'end' and element.tag == 'compound':
+                yield element
+                root.clear()
+
+    def iter_combined(self, filename):
+        """Stream a combined XML file, as written by doxygen's ``combine.xslt``,
+        in one read.
+
+        Yields an ``(element, compound_def)`` pair for every ``compounddef``:
+        `element` is its ``index.xml`` entry, rebuilt from the compound name,
+        the ``memberdef`` elements and their enum values, which is what doxygen
+        lists in the index; `compound_def` is what ``parse_compound_file``
+        returns for it, or None when the plan does not parse it. Members are
+        converted as in `read_compound_file`; deferred ones share one
+        `MemberSource` for the whole file.
+        """
+        wanted = self.plan.sections
+        source = MemberSource(filename, set())
+        entry = sections = members = None
+        convert = skipped = False
+        parents = []
+        for event, element in ingest.iterparse(filename, ('start', 'end'), self.xml_parser):
+            if event == 'start':
+                parents.append(element)
+                if element.tag == 'compounddef':
+                    entry = ET.Element('compound', {'refid': element.attrib['id'], 'kind': element.attrib['kind']})
+                    sections = []
+                elif element.tag == 'sectiondef':
+                    members = []
+                    skipped = wanted is not None and element.attrib.get('kind') not in wanted
+                continue
+
+            parents.pop()
+            if element.tag == 'compoundname' and parents[-1].tag == 'compounddef':
+                ET.SubElement(entry, 'name').text = element.text
+                # Whether a group is parsed depends on its members, so they are converted anyway
+                convert = entry.attrib['kind'] == 'group' or self.plan.wants(entry)
+            elif element.tag == 'memberdef':
+                refid = element.attrib['id']
+                index_member(entry, refid, element.attrib['kind'], element.findtext('name'))
+                for enum_value in element.findall('enumvalue'):
+                    index_member(entry, enum_value.attrib['id'], 'enumvalue', enum_value.findtext('name'))
+                if not convert:
+                    pass
+                elif skipped:
+                    source.compounds.add(entry.attrib['refid'])
+                    members.append((refid, source.fields((entry.attrib['refid'], refid))))
+                else:
+                    members.append((refid, self.read_member(element)))
+                parents[-1].remove(element)
+            elif element.tag == 'sectiondef':
+                if convert and members:
+                    sections.append((element.attrib['kind'], members))
+            elif element.tag == 'compounddef':
+                compound_def = self.read_compound(element, sections) if self.wants(entry) else None
+                parents[-1].remove(element)
+                yield entry, compound_def
+
+    def iter_archive(self, filename, options):
+        """Read a zip or tar archive of the XML directory from start to end.
+
+        Yields an ``(element, compound_def)`` pair for every ``index.xml``
+        entry, in index order, like `iter_combined`. Compound files are parsed
+        as they are read, concurrently with `jobs`, once ``index.xml`` has been
+        read; the ones stored before it in the archive are kept until then.
+        An entry is yielded as soon as it and the entries before it are
+        parsed, so only the compounds stored ahead of their place in the
+        index are held. Deferred members are read back from the archive, see
+        `MemberSource`.
+        """
+        jobs = options.get('jobs') or 1
+        wanted = self.plan.sections
+        filename = os.path.abspath(filename)
+        index = refids = None
+        early = {}
+        parsed = {}
+        # Next index entry to yield
+        position = 0
+        with ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else nullcontext() as executor:
+            def parse(refid, name, data):
+                if executor is None:
+                    parsed[refid] = parse_compound_file(data, wanted, self.xml_parser, (filename, name))
+                else:
+                    parsed[refid] = executor.submit(parse_compound_file, data, wanted, self.xml_parser,
+                                                    (filename, name))
+
+            def ready(wait=False):
+                # The entries whose predecessors are all parsed, in index order
+                nonlocal position
+                while position < len(index):
+                    element = index[position]
+                    refid = element.attrib['refid']
+                    if refid not in refids:
+                        yield element, None
+                    elif refid in parsed and (executor is None or wait or parsed[refid].done()):
+                        compound_def = parsed.pop(refid)
+                        yield element, compound_def if executor is None else compound_def.result()
+                    elif wait:
+                        raise IOError('No {}.xml in {}'.format(refid, filename))
+                    else:
+                        return
+                    position += 1
+
+            for name, data in ingest.iter_archive(filename):
+                refid = posixpath.basename(name)[:-len('.xml')]
+                if refid == 'index':
+                    index = list(self.iter_index(data))
+                    refids = {element.attrib['refid'] for element in index if self.wants(element)}
+                    for refid in refids & early.keys():
+                        parse(refid, *early[refid])
+                    early.clear()
+                elif index is None:
+                    early[refid] = name, data
+                elif refid in refids:
+                    parse(refid, name, data)
+                    yield from ready()
+
+            if index is None:
+                raise IOError('No index.xml in {}'.format(filename))
+            yield from ready(True)
+
+    def wants(self, element):
+        # False for compounds the plan does not parse
+        if self.plan.wants(element):
+            return True
+        if element.attrib['kind'] != 'file':
+            self.log.debug('Not parsing %s %s', element.attrib['kind'], element.attrib['refid'])
+        return False
+
+    def compound_filename(self, element, options):
+        # None for compounds the plan does not parse
+        if not self.wants(element):
+            return None
+        return os.path.join(options['directory'], element.attrib['refid'] + '.xml')
+
+    def parse_index_compound(self, root, element, filename, compound_def):
+        compound = root.find(element.attrib['refid'], element.find('name').text, True, element.attrib['kind'])
+        self.parse_members(compound, element.attrib, element.findall('member'))
+        if filename is not None:
+            self.log.debug('Parsing %s', filename)
+            self.parse_compound(compound, compound_def)
+        return compound
+
+    def cached_compound(self, filename):
+        if filename is None or self.cache is None:
+            return None, None
+        digest = self.cache.digest(filename)
+        return digest, self.cache.get_compound(filename, digest)
 
     def parse_index(self, root, index, options):
-        for element in index:
-            compound = root.find(element.attrib['refid'], element.find('name').text, True)
-            self.parse_members(compound, element.attrib, element.findall('member'))
-            if compound.kind != 'file':
-                self.log.info('Parsing ' + str(os.path.join(options['directory'], compound.refid + '.xml')))
-                doxygen = ET.parse(os.path.join(options['directory'], compound.refid + '.xml'))
-                self.parse_compound(compound, doxygen.find('//compounddef'))
+        profiler = getProfiler()
+        jobs = options.get('jobs') or 1
+        # Only members of the sections kept by the filters are converted while parsing
+        wanted = self.plan.sections
+        if jobs > 1:
+            # Compound files are parsed concurrently, but merged into the tree in
+            # index order so that the result matches the serial run exactly.
+            index = list(index)
+            filenames = [self.compound_filename(element, options) for element in index]
+            cached = [self.cached_compound(filename) for filename in filenames]
+            missing = [filename for filename, (digest, compound_def) in zip(filenames, cached)
+                       if filename is not None and compound_def is None]
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                parsed = executor.map(parse_compound_worker, missing, repeat(wanted), repeat(self.xml_parser),
+                                      chunksize=max(1, len(missing) // (jobs * 8)))
+                for element, filename, (digest, compound_def) in zip(index, filenames, cached):
+                    elapsed = 0.0
+                    with profiler.phase('parse_compound'):
+                        if filename is not None and compound_def is None:
+                            compound_def, elapsed = next(parsed)
+                            if self.cache is not None:
+                                self.cache.set_compound(filename, digest, compound_def)
+                        start = time.perf_counter()
+                        compound = self.parse_index_compound(root, element, filename, compound_def)
+                    # Time spent parsing in the worker, not waiting for it, and merging
+                    profiler.compound(compound, 'parse_compound', elapsed + time.perf_counter() - start)
+        else:
+            for element in index:
+                with profiler.phase('parse_compound') as timer:
+                    filename = self.compound_filename(element, options)
+                    digest, compound_def = self.cached_compound(filename)
+                    if filename is not None and compound_def is None:
+                        compound_def = parse_compound_file(filename, wanted, self.xml_parser)
+                        if self.cache is not None:
+                            self.cache.set_compound(filename, digest, compound_def)
+                    compound = self.parse_index_compound(root, element, filename, compound_def)
+                profiler.compound(compound, 'parse_compound', timer.elapsed)
+
+    def parse_entries(self, root, entries, source):
+        """Merge the ``(element, compound_def)`` pairs read from the combined
+        file or archive `source` into the tree, in order."""
+        profiler = getProfiler()
+        for element, compound_def in entries:
+            with profiler.phase('parse_compound') as timer:
+                filename = None
+                if compound_def is not None:
+                    filename = '{}:{}'.format(source, element.attrib['refid'])
+                compound = self.parse_index_compound(root, element, filename, compound_def)
+            profiler.compound(compound, 'parse_compound', timer.elapsed)
+
+    # Snapshots of the parsed tree
+    def save_snapshot(self, filename, directory):
+        """Write the parsed tree and references to `filename`.
+
+        The snapshot records a fingerprint of the XML files in `directory`
+        and the parse plan, so `load_snapshot` can tell when it is out of date
+        or lacks compounds the current options need.
+        """
+        data = {'version': SNAPSHOT_VERSION, 'source': source_fingerprint(directory), 'plan': self.plan.key(),
+                'root': self.root, 'references': self.references}
+        dirname = os.path.dirname(filename)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        with open(filename + '.tmp', 'wb') as file:
+            pickle.dump(data, file, pickle.HIGHEST_PROTOCOL)
+        os.replace(filename + '.tmp', filename)
+
+    def load_snapshot(self, filename, directory):
+        """Load the tree and references saved by `save_snapshot`.
+
+        Returns False, leaving the parser untouched, when there is no usable
+        snapshot, the XML files in `directory` changed since it was saved or
+        it was parsed with a different plan.
+        """
+        try:
+            with open(filename, 'rb') as file:
+                data = pickle.load(file)
+        except (IOError, EOFError, pickle.UnpicklingError, AttributeError) as err:
+            self.log.info('Not using snapshot: %s', err)
+            return False
+        if data.get('version') != SNAPSHOT_VERSION or data.get('source') != source_fingerprint(directory) or \
+                data.get('plan') != self.plan.key():
+            self.log.info('Snapshot %s is out of date', filename)
+            return False
+        self.root = data['root']
+        self.references = data['references']
+        self.root.reindex()
+        return True
 
     def load_index(self, options, callback):
         err = None
+        self.plan = ParsePlan(options)
+        self.xml_parser = ingest.backend_name(options.get('xml_parser'))
+        snapshot = options.get('from_snapshot')
+        if snapshot and self.load_snapshot(snapshot, options['directory']):
+            self.log.info('Loaded snapshot %s', snapshot)
+            self.hierarchy = Hierarchy(self.references)
+            callback(err, self.root)
+            return
+
+        # The XML directory, an archive of it or a combined XML file
+        directory = options['directory']
+        index = os.path.join(directory, 'index.xml')
         try:
-            with open(os.path.join(options['directory'], 'index.xml'), 'r', encoding='utf-8') as file:
-                data = file.read()
+            if os.path.isfile(directory):
+                archive = ingest.is_archive(directory)
+            else:
+                archive = None
+                with open(index, 'rb'):
+                    pass
         except IOError as err:
             callback('Failed to load doxygen XML: ' + str(err))
             return
 
         try:
-            xml_parser = ET.fromstring(data)
-        except ET.ParseError as err:
+            with getProfiler().phase('load_index'):
+                if archive:
+                    self.parse_entries(self.root, self.iter_archive(directory, options), directory)
+                elif archive is not None:
+                    self.parse_entries(self.root, self.iter_combined(directory), directory)
+                else:
+                    self.parse_index(self.root, self.iter_index(index), options)
+        except (IOError,) + ingest.ArchiveError as err:
+            callback('Failed to load doxygen XML: ' + str(err))
+            return
+        except ingest.ParseError as err:
             callback('Failed to parse doxygen XML: ' + str(err))
             return
 
-        self.parse_index(self.root, xml_parser.findall('compound'), options)
+        # A stale snapshot given with from_snapshot is refreshed
+        for filename in {options.get('save_snapshot'), snapshot} - {None}:
+            self.save_snapshot(filename, options['directory'])
+        with getProfiler().phase('hierarchy'):
+            self.hierarchy = Hierarchy(self.references)
         callback(err, self.root)
 
     def inline(self, strings):
         return re.sub(r'\n+', '', ' '.join(strings))
 
 
+def index_member(entry, refid, kind, name):
+    # A <member> of an index.xml compound entry
+    member = ET.SubElement(entry, 'member', {'refid': refid, 'kind': kind})
+    ET.SubElement(member, 'name').text = name
+
+
+def has_children(element):
+    # Element truthiness, which lxml warns about
+    return element is not None and len(element) > 0
+
+
+# Changed whenever the snapshot layout or the parsed tree changes
+SNAPSHOT_VERSION = 6
+
+# Member fields converted to markdown by `DoxygenParser.read_member`
+MEMBER_FIELDS = ('briefdescription', 'detaileddescription', 'summary', 'proto', 'enumvalue')
+
+
+class MemberSource:
+    """Members of a compound XML file that were parsed without converting them.
+
+    Holds only the file name until a deferred field of one of these members is
+    read; the file is then parsed again, once, and all its members converted.
+    Members that the filters leave out of the output are never read, so their
+    descriptions cost nothing but the XML parsing.
+
+    Compound files read from an archive are held as the archive name and
+    their name in it, and read back from the archive. For a combined file, `compounds` collects the ids of the
+    compounds with deferred members, whose members are keyed by
+    ``(compound id, member id)``.
+    """
+    __slots__ = ('filename', 'compounds', 'members')
+
+    def __init__(self, filename, compounds=None):
+        self.filename = os.path.abspath(filename) if isinstance(filename, str) else filename
+        self.compounds = compounds
+        self.members = None
+
+    def fields(self, refid):
+        return {key: MemberField(self, refid, key) for key in MEMBER_FIELDS}
+
+    def get(self, refid, key):
+        if self.members is None:
+            filename = self.filename
+            if isinstance(filename, tuple):
+                filename = ingest.read_archive(*filename)
+            self.members = DoxygenParser().read_members(filename, self.compounds)
+        return self.members[refid].get(key)
+
+
+class MemberField(Deferred):
+    """One field of a `MemberSource` member, read when it is first accessed."""
+    __slots__ = ('source', 'refid', 'key')
+
+    def __init__(self, source, refid, key):
+        self.source = source
+        self.refid = refid
+        self.key = key
+
+    def resolve(self):
+        return self.source.get(self.refid, self.key)
+
+
+def source_fingerprint(directory):
+    """Absolute path of `directory`, then the name, size and modification time
+    of every XML file in it, or of `directory` itself when it is an archive or
+    combined file.
+
+    The path is part of it because members of a snapshot are read back from
+    the files they were parsed from; a copy with the same times is not the same
+    source.
+    """
+    path = os.path.abspath(directory)
+    if os.path.isfile(directory):
+        stat = os.stat(directory)
+        return [path, (os.path.basename(directory), stat.st_size, stat.st_mtime_ns)]
+    entries = []
+    with os.scandir(directory) as files:
+        for entry in files:
+            if entry.name.endswith('.xml'):
+                stat = entry.stat()
+                entries.append((entry.name, stat.st_size, stat.st_mtime_ns))
+    return [path] + sorted(entries)
+
+
+def parse_compound_file(filename, wanted=None, xml_parser=None, source=None):
+    """Parse a compound XML file into the picklable form used by ``DoxygenParser.parse_compound``.
+
+    `source` names the file when `filename` is its content, see `MemberSource`.
+    """
+    if filename is None:
+        return None
+    parser = DoxygenParser()
+    parser.xml_parser = xml_parser
+    return parser.read_compound_file(filename, wanted, source)
+
+
+def parse_compound_worker(filename, wanted=None, xml_parser=None):
+    # `parse_compound_file` in a worker process, with the time it took
+    start = time.perf_counter()
+    compound_def = parse_compound_file(filename, wanted, xml_parser)
+    return compound_def, time.perf_counter() - start
+
+
 if __name__ == "__main__":
     c = Compound()
\ No newline at end of file
@@ -1,7 +1,9 @@
 import os
+import queue
 import re
-import python_utils as util
+import threading
 from moxygen.logger import getLogger
+from moxygen.profile import getProfiler
 
 
 def inline(code):
@@ -51,44 +53,217 @@ def find_parent(compound, kinds):
         compound = compound['parent']
 
 
-def resolve_refs(content, compound, references, options):
-    import re
-    return re.sub(r"\{#ref ([^ ]+) #\}", lambda m: 
-                  '#' + m.group(1) if m.group(1) in references else 
-                  '{}#{}'.format(compound_path(find_parent(references[m.group(1)], ['page']), options), m.group(1)) 
-                  if find_parent(references[m.group(1)], ['page']) and options['groups'] else 
-                  '{}#{}'.format(compound_path(references[m.group(1)], options), m.group(1)) if options['groups'] else 
-                  compound_path(find_parent(references[m.group(1)], ['namespace', 'class', 'struct']), options) + '#' + m.group(1),
-                  content)
+# A whole link to a reference, its text allowing one level of brackets, or a
+# reference on its own
+REF_PATTERN = re.compile(r"\[((?:[^\[\]]|\[[^\[\]]*\])*)\]\(\{#ref ([^ ]+) #\}\)|\{#ref ([^ ]+) #\}")
+
+
+def ref_paths(references, options, plan=None):
+    """Map every refid to the output file its anchor is written to.
+
+    Computed once after parsing, so resolving a document does not have to walk
+    the tree for each reference. refids that cannot be placed in a file map
+    to None and resolve to a local anchor. refids of namespaces or groups
+    that the `only` list of `plan` leaves out of the output map to False,
+    and links to them are reduced to their text.
+    """
+    paths = {}
+    for refid, ref in references.items():
+        path = None
+        page = find_parent(ref, ['page'])
+        if plan is not None and not page and not selected(ref, options, plan):
+            path = False
+        elif page and options['pages']:
+            path = compound_path(page, options)
+        elif options['groups']:
+            if ref.get('groupname'):
+                path = compound_path(ref, options)
+        elif options['classes']:
+            dest = find_parent(ref, ['namespace', 'class', 'struct'])
+            if dest:
+                path = compound_path(dest, options)
+        else:
+            path = options['output']
+        paths[refid] = path
+    return paths
+
+
+def selected(ref, options, plan):
+    """True if `ref` is written to the output selected by the `only` list of `plan`."""
+    if plan.only is None:
+        return True
+    if options['groups']:
+        # Only the listed groups are written, and only their files are parsed
+        # to tell which group a compound belongs to
+        return bool(ref.get('groupname')) and plan.selects(ref['groupname'], 'group')
+    owner = find_parent(ref, ['namespace']) or find_parent(ref, ['class', 'struct', 'union', 'interface'])
+    return owner is None or plan.selects(owner['name'], owner['kind'])
+
+
+def resolve_refs(content, compound, references, options, paths=None):
+    if paths is None:
+        paths = ref_paths(references, options)
+    filepath = compound_path(compound, options)
+
+    def resolve(match):
+        text, refid = match.group(1, 2)
+        if refid is None:
+            refid = match.group(3)
+        path = paths.get(refid)
+        if path is False and text is not None:
+            return text
+        if not path or path == filepath:
+            href = '#' + refid
+        else:
+            href = path + '#' + refid
+        return href if text is None else '[{}]({})'.format(text, href)
+
+    return REF_PATTERN.sub(resolve, content)
 
 
 def compound_path(compound, options):
-    print("COMPOUND PATH")
-    print(compound.kind)
-    if compound.kind == 'page':
+    if compound['kind'] == 'page':
         return os.path.dirname(options['output']) + "/page-" + compound['name'] + ".md"
     elif options['groups']:
-        return util.format(options['output'], compound['groupname'])
+        return options['output'].replace('%s', compound['groupname'], 1)
     elif options['classes']:
-        return util.format(options['output'], compound['name'].replace(':', '-').replace('<', '(').replace('>', ')'))
+        return options['output'].replace('%s', compound['name'].replace(':', '-').replace('<', '(').replace('>', ')'), 1)
     else:
         return options['output']
 
 
-def write_compound(compound, contents, references, options):
-    print(len(contents))
-    for content in contents:
-        if content is not None:
-            resolve_content = resolve_refs(content, compound, references, options)
-            if resolve_content:
-                write_file(compound_path(compound, options), resolve_content)
+def write_compound(compound, contents, references, options, sink=None, paths=None):
+    if paths is None:
+        paths = ref_paths(references, options)
+    flush = sink is None
+    if flush:
+        sink = OutputSink()
+    filepath = compound_path(compound, options)
+    for content in resolve_compound(compound, contents, references, options, paths):
+        sink.append(filepath, content)
+    if flush:
+        sink.flush()
+
+
+def resolve_compound(compound, contents, references, options, paths=None):
+    """The markdown `contents` rendered for `compound` with their references
+    resolved, leaving out empty ones."""
+    if paths is None:
+        paths = ref_paths(references, options)
+    resolved = []
+    with getProfiler().phase('resolve_refs'):
+        for content in contents:
+            if content is not None:
+                resolve_content = resolve_refs(content, compound, references, options, paths)
+                if resolve_content:
+                    resolved.append(resolve_content)
+    return resolved
+
+
+class OutputSink:
+    """Collects the content of every output file and writes each file once.
+
+    Files are written atomically, by `jobs` threads. A complete file given
+    to `put` is handed to the writer threads right away, so it is written
+    while later files are still rendered; the queue to the writers holds at
+    most `QUEUE_SIZE` files and `put` waits when it is full. Files collected
+    with `append` are written when `flush` is called, which also waits for
+    the writers. With `skip_unchanged` (or a `Cache`), a file whose
+    content is the same as what is already on disk is left untouched, so its
+    mtime stays stable.
+    """
+
+    QUEUE_SIZE = 64
+
+    def __init__(self, cache=None, skip_unchanged=False, jobs=1):
+        self.cache = cache
+        self.skip_unchanged = skip_unchanged
+        self.jobs = jobs
+        self.files = {}
+        self.queue = None
+        self.threads = []
+        self.errors = []
+        # Directories created so far, shared by the writer threads
+        self.directories = set()
+        self.lock = threading.Lock()
+
+    def append(self, filepath, content):
+        self.files.setdefault(filepath, []).append(content)
+
+    def put(self, filepath, contents):
+        """Write `contents`, the whole content of `filepath`, in a writer thread."""
+        if self.queue is None:
+            self.queue = queue.Queue(self.QUEUE_SIZE)
+            for _ in range(max(1, self.jobs)):
+                thread = threading.Thread(target=self.writer, daemon=True)
+                thread.start()
+                self.threads.append(thread)
+        self.queue.put((filepath, contents))
+
+    def writer(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            try:
+                self.write_one(*item)
+            except Exception as err:
+                self.errors.append(err)
+
+    def write_one(self, filepath, contents):
+        dirPath = os.path.dirname(filepath)
+        if dirPath:
+            with self.lock:
+                if dirPath not in self.directories:
+                    os.makedirs(dirPath, exist_ok=True)
+                    self.directories.add(dirPath)
+        if self.unchanged(filepath, contents):
+            getLogger().info('Unchanged: %s', filepath)
+            return
+        write_file(filepath, contents)
+
+    def unchanged(self, filepath, contents):
+        if self.cache is not None:
+            return self.cache.unchanged(filepath, contents)
+        if not self.skip_unchanged:
+            return False
+        data = contents.encode('utf-8')
+        try:
+            if os.path.getsize(filepath) != len(data):
+                return False
+            with open(filepath, 'rb') as f:
+                return f.read() == data
+        except OSError:
+            return False
+
+    def flush(self):
+        with getProfiler().phase('write'):
+            for filepath, contents in self.files.items():
+                self.put(filepath, ''.join(contents))
+            self.files = {}
+            self.close()
+
+    def close(self):
+        """Wait for the files handed to the writer threads, leaving the others unwritten."""
+        self.files = {}
+        if self.queue is None:
+            return
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.queue = None
+        self.threads = []
+        if self.errors:
+            err, self.errors = self.errors[0], []
+            raise err
 
 
 def write_file(filepath, contents):
     logger = getLogger()
-    logger.info('Writing: ' + filepath)
-    dirPath = os.path.dirname(filepath)
-    if not os.path.exists(dirPath):
-        os.makedirs(dirPath)
-    with open(filepath, 'a') as f:
+    logger.info('Writing: %s', filepath)
+    # Write to a temporary file and rename it, so readers never see a partial file
+    tmpPath = filepath + '.tmp'
+    with open(tmpPath, 'w', encoding='utf-8') as f:
         f.write(''.join(contents))
+    os.replace(tmpPath, filepath)
@@ -0,0 +1,126 @@
+from moxygen.compound import Compound, Deferred
+
+# Compound kinds that take part in inheritance
+CLASS_KINDS = frozenset(('class', 'struct', 'union', 'interface'))
+
+# Fields set on classes, only computed or copied for templates that read them
+FIELDS = ('derivedcompoundref', 'inheritedmembers')
+
+
+class Hierarchy:
+    """Class hierarchy of a parsed tree, built once after parsing.
+
+    Maps every class to its resolved bases and to the classes deriving from
+    it, and keeps a flattened table of the members each class inherits,
+    computed the first time it is asked for, so only the classes rendered
+    with a template that reads it pay for it, once. The render cache and
+    `Compound.detach` leave both fields alone for other templates.
+
+    Classes get two fields for templates: ``derivedcompoundref``, the classes
+    deriving directly from them, and ``inheritedmembers``, the members they
+    inherit, computed when first read. A base is resolved by the ``refid``
+    doxygen gives it and otherwise by name; bases outside the XML, such as
+    ``std::exception``, stay unresolved.
+    """
+
+    def __init__(self, references):
+        self.bases = {}
+        self.derived = {}
+        self.tables = {}
+        classes = [compound for compound in references.values()
+                   if isinstance(compound, Compound) and compound.kind in CLASS_KINDS]
+        by_name = {compound.name: compound for compound in classes}
+        for compound in classes:
+            bases = []
+            for base in compound.basecompoundref:
+                target = references.get(base.get('refid')) if base.get('refid') else by_name.get(base['name'])
+                if not isinstance(target, Compound):
+                    continue
+                base['refid'] = target.refid
+                bases.append((target, base))
+                self.derived.setdefault(target.refid, []).append((compound, base))
+            self.bases[compound.refid] = bases
+
+        for compound in classes:
+            derived = self.derived.get(compound.refid)
+            if derived:
+                compound['derivedcompoundref'] = [{'refid': child.refid, 'name': child.name, 'prot': base['prot'],
+                                                   'virt': base.get('virt')} for child, base in derived]
+            if self.bases[compound.refid]:
+                compound['inheritedmembers'] = InheritedMembers(self, compound)
+
+    def base_classes(self, compound):
+        """The resolved direct bases of `compound`, in declaration order."""
+        return [base for base, ref in self.bases.get(compound.refid, ())]
+
+    def derived_classes(self, compound):
+        """The classes deriving directly from `compound`, in index order."""
+        return [child for child, ref in self.derived.get(compound.refid, ())]
+
+    def inherited(self, compound):
+        """``(member, class)`` pairs for every member `compound` inherits and
+        the class declaring it, nearest bases first.
+
+        Private members, constructors and destructors are not inherited, nor
+        is anything through a private base; a member is hidden by a member
+        of the same name in a class nearer to `compound`. Each base class is
+        visited once, as with virtual inheritance, so the table costs the
+        members of the ancestors of `compound` and is kept for later calls.
+        """
+        table = self.tables.get(compound.refid)
+        if table is not None:
+            return table
+        table = []
+        seen = set()
+        visited = {compound.refid}
+        # Number of classes on the current path declaring each name
+        hidden = {}
+        for member in compound.members:
+            hidden[member.name] = 1
+        # Depth-first through the bases in declaration order, without
+        # recursion as hierarchies can be deeper than the recursion limit
+        stack = [(iter(self.bases.get(compound.refid, ())), ())]
+        while stack:
+            bases, names = stack[-1]
+            entry = next(bases, None)
+            if entry is None:
+                stack.pop()
+                for name in names:
+                    hidden[name] -= 1
+                continue
+            base, ref = entry
+            if ref.get('prot') == 'private' or base.refid in visited:
+                continue
+            visited.add(base.refid)
+            short = base.name.rsplit('::', 1)[-1]
+            for member in base.members:
+                if member.section and not member.section.startswith('private') and member.section != 'friend' \
+                        and member.name not in (short, '~' + short) and not hidden.get(member.name) \
+                        and member.refid not in seen:
+                    seen.add(member.refid)
+                    table.append((member, base))
+            names = {member.name for member in base.members}
+            for name in names:
+                hidden[name] = hidden.get(name, 0) + 1
+            stack.append((iter(self.bases.get(base.refid, ())), names))
+        self.tables[compound.refid] = table
+        return table
+
+    def inherited_fields(self, compound):
+        # What templates read of each inherited member
+        return [{'refid': member.refid, 'kind': member.kind, 'name': member.name, 'section': member.section,
+                 'proto': member.proto, 'summary': member.summary, 'inheritedfrom': owner.name,
+                 'inheritedfromrefid': owner.refid}
+                for member, owner in self.inherited(compound)]
+
+
+class InheritedMembers(Deferred):
+    """The ``inheritedmembers`` field of a class, read from the `Hierarchy`."""
+    __slots__ = ('hierarchy', 'compound')
+
+    def __init__(self, hierarchy, compound):
+        self.hierarchy = hierarchy
+        self.compound = compound
+
+    def resolve(self):
+        return self.hierarchy.inherited_fields(self.compound)
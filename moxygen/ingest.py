@@ -0,0 +1,126 @@
+"""Reading doxygen XML files.
+
+`iterparse` is a drop-in for ``ElementTree.iterparse`` that memory-maps the
+file and feeds slices of the mapping straight to expat, so the bytes are
+neither read into Python objects nor decoded before parsing. With the
+``lxml`` backend, when lxml is installed, libxml2 reads the file itself from
+C. Both backends yield elements with the same interface and give the same
+output. lxml produces events faster, but the description conversion walks
+every element through lxml's proxy objects, which costs more than it saves,
+so ElementTree is the default; ``benchmarks/ingest.py`` compares the two on
+a corpus.
+
+Besides the XML directory, the input can be a zip or tar archive of it,
+read with `iter_archive`, or a single combined file as written by doxygen's
+``combine.xslt``, which `DoxygenParser.iter_combined` reads.
+"""
+import io
+import mmap
+import os
+import posixpath
+import tarfile
+import xml.etree.ElementTree as ET
+import zipfile
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
+BACKENDS = ('etree', 'lxml')
+
+# Bytes fed to expat at a time, so events are handed out while parsing
+CHUNK = 1 << 16
+
+if lxml_etree is not None:
+    ParseError = (ET.ParseError, lxml_etree.XMLSyntaxError)
+else:
+    ParseError = ET.ParseError
+
+# Errors reading an archive given as input
+ArchiveError = (tarfile.TarError, zipfile.BadZipFile, zipfile.LargeZipFile)
+
+
+def backend_name(backend=None):
+    """The backend used for `backend`, ``etree`` by default."""
+    if backend is None:
+        return 'etree'
+    if backend not in BACKENDS:
+        raise ValueError('Unknown XML parser "{}", use one of {}.'.format(backend, ', '.join(BACKENDS)))
+    if backend == 'lxml' and lxml_etree is None:
+        raise ValueError('The lxml XML parser is not installed.')
+    return backend
+
+
+def iterparse(source, events=('end',), backend=None):
+    """Parse `source`, a file name or a bytes-like object, yielding
+    ``(event, element)`` pairs like ``ElementTree.iterparse``."""
+    if backend_name(backend) == 'lxml':
+        if not isinstance(source, str):
+            source = io.BytesIO(bytes(source))
+        # Comments and processing instructions would show up as elements
+        yield from lxml_etree.iterparse(source, events=events, remove_comments=True, remove_pis=True,
+                                        huge_tree=True)
+        return
+
+    if not isinstance(source, str):
+        yield from feed(source, events)
+        return
+    with open(source, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            # Empty files cannot be mapped; expat reports the error
+            yield from feed(b'', events)
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+            yield from feed(mapping, events)
+
+
+def feed(buffer, events):
+    parser = ET.XMLPullParser(events)
+    view = memoryview(buffer)
+    try:
+        for start in range(0, len(view), CHUNK):
+            with view[start:start + CHUNK] as chunk:
+                parser.feed(chunk)
+            yield from parser.read_events()
+        parser.close()
+        yield from parser.read_events()
+    finally:
+        # The mapping cannot be closed while a view of it exists
+        view.release()
+
+
+def is_archive(filename):
+    """True if `filename` is a zip or tar archive, compressed or not."""
+    return zipfile.is_zipfile(filename) or tarfile.is_tarfile(filename)
+
+
+def iter_archive(filename):
+    """The ``.xml`` files of a zip or tar archive as ``(name, content)`` pairs,
+    named by their path in the archive.
+
+    The archive is read once from start to end, so files come in archive
+    order; zip archives, which have a table of contents, hand out
+    ``index.xml`` first.
+    """
+    if zipfile.is_zipfile(filename):
+        with zipfile.ZipFile(filename) as archive:
+            infos = [info for info in archive.infolist() if not info.is_dir() and info.filename.endswith('.xml')]
+            infos.sort(key=lambda info: posixpath.basename(info.filename) != 'index.xml')
+            for info in infos:
+                yield info.filename, archive.read(info)
+        return
+    # Stream mode: members are read in order without seeking back
+    with tarfile.open(filename, 'r|*') as archive:
+        for member in archive:
+            if member.isfile() and member.name.endswith('.xml'):
+                yield member.name, archive.extractfile(member).read()
+
+
+def read_archive(filename, name):
+    """The content of file `name`, as named by `iter_archive`, of a zip or tar archive."""
+    if zipfile.is_zipfile(filename):
+        with zipfile.ZipFile(filename) as archive:
+            return archive.read(name)
+    with tarfile.open(filename) as archive:
+        return archive.extractfile(name).read()
@@ -1,35 +1,58 @@
 import logging
 
-# Create the global logger object
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+# Create the global logger object. It does not propagate to the root logger,
+# so programs embedding moxygen decide themselves what reaches their handlers.
+logger = logging.getLogger('moxygen')
+logger.setLevel(logging.WARNING)
+logger.propagate = False
 
+# Handlers added by initLogger, replaced on the next call
+handlers = []
 
-def initLogger(options, defaultOptions):
-    # Logger transports
-    logfile = None
-    logterm = None
 
-    # Create log console handler
-    logterm = logging.StreamHandler()
-    logterm.setLevel(logging.INFO)
-    logterm.setFormatter(logging.Formatter('%(message)s'))
-    
-    getLogger().addHandler(logterm)
+def verbosity_level(options):
+    """Log level asked for by the `quiet` and `verbose` options.
 
-    # Use default log file name?
-    if options['logfile'] is None:
-        options['logfile'] = defaultOptions['logfile']
+    Warnings are shown by default, `verbose` adds progress messages (1) and
+    per compound and member details (2); `quiet` only shows errors.
+    """
+    if options.get('quiet'):
+        return logging.ERROR
+    verbose = options.get('verbose') or 0
+    if verbose >= 2:
+        return logging.DEBUG
+    if verbose >= 1:
+        return logging.INFO
+    return logging.WARNING
 
-    # Create log file handler
-    logfile = logging.FileHandler(options['logfile'])
-    logfile.setLevel(logging.DEBUG)
 
-    logger.addHandler(logfile)
+def initLogger(options, defaultOptions):
+    level = verbosity_level(options)
+    for handler in handlers:
+        logger.removeHandler(handler)
+        handler.close()
+    handlers.clear()
 
-    # Set the logging level
-    if not options.get('quiet'):
-        set_level(logging.INFO)
+    # Create log console handler
+    logterm = logging.StreamHandler()
+    logterm.setLevel(level)
+    logterm.setFormatter(logging.Formatter('%(message)s'))
+    handlers.append(logterm)
+
+    # Create log file handler, only when a log file is asked for. The file also
+    # gets progress messages, unless `quiet` is set.
+    if options.get('logfile'):
+        logfile = logging.FileHandler(options['logfile'], mode='w', encoding='utf-8')
+        logfile.setLevel(min(level, logging.INFO) if not options.get('quiet') else level)
+        logfile.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+        handlers.append(logfile)
+
+    for handler in handlers:
+        logger.addHandler(handler)
+
+    # The logger level is the lowest handler level, so messages nobody would
+    # see are dropped by a single comparison before they are formatted.
+    set_level(min(handler.level for handler in handlers))
 
 
 def getLogger():
@@ -0,0 +1,158 @@
+"""Built-in templates compiled by hand into plain Python functions.
+
+Each function produces exactly what pybars renders from the template of the
+same name in ``templates/cpp``: same text, same HTML escaping of values and
+helper results, same handling of missing values. They are only used when
+the loaded template source is byte for byte the built-in one, which is
+checked with the digests in `TEMPLATES`; any other template goes through
+pybars. ``benchmarks/native.py`` checks the equivalence and measures the
+speed-up.
+"""
+from moxygen.helper import get_anchor
+
+SUMMARY = (' Members                        | Descriptions                                \n'
+           '--------------------------------|---------------------------------------------\n')
+VALUES = (' Values                         | Descriptions                                \n'
+          '--------------------------------|---------------------------------------------\n')
+
+
+def escape(text):
+    # Same result as pybars' escape, which runs a regex with a Python callback
+    if '&' in text:
+        text = text.replace('&', '&amp;')
+    return (text.replace('"', '&quot;').replace("'", '&#x27;').replace('`', '&#x60;')
+            .replace('<', '&lt;').replace('>', '&gt;'))
+
+
+def value(item, name):
+    # {{name}}: missing values render as nothing, others are escaped
+    result = item.get(name)
+    if result is None:
+        return ''
+    if type(result) is bool:
+        return 'true' if result else 'false'
+    return escape(str(result))
+
+
+def cell(item, name):
+    # {{cell name}}
+    return escape(item.get(name).replace('|', r'\|').replace('\n', '<br/>'))
+
+
+def title(item, name):
+    # {{title name}}
+    return escape(item.get(name).replace('\n', '<br/>'))
+
+
+def anchor(item, options):
+    # {{anchor refid}}
+    return escape(get_anchor(item.get('refid'), options))
+
+
+def filtered(compound, name):
+    return (compound.get('filtered') or {}).get(name) or ()
+
+
+def summary_rows(out, compound, first, second, padding):
+    # {{#each filtered.<first>}}{{cell proto}}<padding>| {{cell summary}}
+    # {{/each}}{{#each filtered.<second>}}{{cell proto}} | {{cell summary}}
+    # {{/each}}
+    for item in filtered(compound, first):
+        out.append(cell(item, 'proto') + padding + '| ' + cell(item, 'summary') + '\n')
+    for item in filtered(compound, second):
+        out.append(cell(item, 'proto') + ' | ' + cell(item, 'summary') + '\n')
+
+
+def enum_values(out, item):
+    # {{#if enumvalue}} ... {{#each enumvalue}}{{cell name}}            | {{cell summary}}{{/each}} ... {{/if}}
+    if item.get('enumvalue'):
+        out.append(VALUES)
+        for enum_value in item.get('enumvalue'):
+            out.append(cell(enum_value, 'name') + '            | ' + cell(enum_value, 'summary') + '\n')
+
+
+def member_heading(out, item, options):
+    out.append('#### ' + title(item, 'proto') + ' ' + anchor(item, options) + '\n\n')
+
+
+def render_class(compound, options):
+    out = ['## ', value(compound, 'kind'), ' `', value(compound, 'name'), '` ', anchor(compound, options), '\n\n']
+    if compound.get('basecompoundref'):
+        out.append('```\n' + value(compound, 'kind') + ' ' + value(compound, 'name') + '\n')
+        for base in compound.get('basecompoundref'):
+            out.append('  : ' + value(base, 'prot') + ' ' + value(base, 'name') + '\n')
+        out.append('```\n')
+    out.extend(['\n', value(compound, 'briefdescription'), '\n\n', value(compound, 'detaileddescription'), '\n\n',
+                '### Summary\n\n', SUMMARY])
+    summary_rows(out, compound, 'compounds', 'members', '        ')
+    out.append('\n### Members\n\n')
+    for item in filtered(compound, 'compounds'):
+        member_heading(out, item, options)
+        out.extend([value(item, 'briefdescription'), '\n\n', value(item, 'detaileddescription'), '\n'])
+    out.append('\n')
+    for item in filtered(compound, 'members'):
+        member_heading(out, item, options)
+        enum_values(out, item)
+        out.extend(['\n', value(item, 'briefdescription'), '\n\n', value(item, 'detaileddescription'), '\n'])
+    out.append('\n')
+    return ''.join(out)
+
+
+def render_namespace(compound, options):
+    out = ['# ', value(compound, 'kind'), ' `', value(compound, 'name'), '` ', anchor(compound, options), '\n\n',
+           value(compound, 'briefdescription'), '\n\n', value(compound, 'detaileddescription'), '\n\n',
+           '## Summary\n\n', SUMMARY]
+    summary_rows(out, compound, 'members', 'compounds', '            ')
+    out.append('\n')
+    if filtered(compound, 'members'):
+        out.append('## Members\n\n')
+        for item in filtered(compound, 'members'):
+            member_heading(out, item, options)
+            enum_values(out, item)
+            out.extend(['\n', value(item, 'briefdescription'), '\n\n', value(item, 'detaileddescription'), '\n\n'])
+    return ''.join(out)
+
+
+def render_index(compound, options):
+    out = ['# Summary\n\n', SUMMARY]
+    summary_rows(out, compound, 'members', 'compounds', '            ')
+    out.append('\n')
+    if filtered(compound, 'members'):
+        out.append('## Members\n\n')
+        for item in filtered(compound, 'members'):
+            member_heading(out, item, options)
+            out.extend([value(item, 'briefdescription'), '\n\n'])
+            enum_values(out, item)
+            out.extend(['\n', value(item, 'detaileddescription'), '\n\n'])
+    return ''.join(out)
+
+
+def render_page(compound, options):
+    out = ['# ', value(compound, 'kind'), ' `', value(compound, 'name'), '` ', anchor(compound, options), '\n\n',
+           value(compound, 'briefdescription'), '\n\n', value(compound, 'detaileddescription'), '\n\n']
+    if filtered(compound, 'members'):
+        out.extend(['\n## Summary\n\n', SUMMARY])
+        summary_rows(out, compound, 'members', 'compounds', '            ')
+        out.append('\n## Members\n\n')
+        for item in filtered(compound, 'members'):
+            member_heading(out, item, options)
+            enum_values(out, item)
+            out.extend(['\n', value(item, 'briefdescription'), '\n\n', value(item, 'detaileddescription'), '\n\n'])
+    return ''.join(out)
+
+
+# Template name: (sha1 of the built-in template source, renderer)
+TEMPLATES = {
+    'class': ('0a0baade5f59c1a05e7617eda789214a23a5fa2e', render_class),
+    'index': ('269aeaac5f4ba1ad00fa15402db1c447d25eefba', render_index),
+    'namespace': ('7ed1c6a1a547a15d8cd285bf3fb6cd917bb8a84b', render_namespace),
+    'page': ('2b84b0d632b82f280bb476924bf004107557b8e3', render_page),
+}
+
+
+def native_template(name, digest):
+    """The native renderer for template `name` if `digest` is its built-in source, else None."""
+    entry = TEMPLATES.get(name)
+    if entry is not None and entry[0] == digest:
+        return entry[1]
+    return None
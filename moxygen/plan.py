@@ -0,0 +1,70 @@
+class ParsePlan:
+    """Which compound XML files can contribute to the output.
+
+    Decided from the ``index.xml`` entry of each compound alone, before its
+    file is opened, using the output mode, the filters and the `only` list:
+
+    * ``file`` compounds are never parsed;
+    * namespaces are always parsed (they place their classes in the tree),
+      unless `only` leaves them out;
+    * groups are parsed in `groups` mode and when the index lists members
+      for them, as their members take their section and description from
+      the group file;
+    * pages are parsed in `pages` mode;
+    * any other compound only when its kind is in the compound filters and,
+      with `only`, when it belongs to one of the listed namespaces.
+
+    Compounds that are not parsed are still created from the index, with
+    their members, so references to them resolve to the same links as
+    before. Without filters every compound but files is parsed.
+
+    With several output `targets` the plan covers what any of them needs.
+    """
+
+    def __init__(self, options):
+        targets = options.get('targets') or [options]
+        filters = [target.get('filters') for target in targets]
+        if all(filters):
+            self.kinds = frozenset(kind for f in filters for kind in f['compounds'])
+            # Member sections converted to markdown while parsing, see `MemberSource`
+            self.sections = frozenset(section for f in filters for section in f['members'])
+        else:
+            self.kinds = self.sections = None
+        self.groups = any(target.get('groups') for target in targets)
+        self.pages = any(target.get('pages') for target in targets)
+        if all(target.get('only') for target in targets):
+            self.only = tuple(dict.fromkeys(name for target in targets for name in target['only']))
+        else:
+            self.only = None
+
+    def key(self):
+        # What a parse following this plan depends on, for snapshots
+        return (sorted(self.kinds) if self.kinds is not None else None, self.groups, self.pages, self.only)
+
+    def wants(self, element):
+        """True if the compound file of index entry `element` has to be parsed."""
+        kind = element.attrib['kind']
+        if kind == 'file':
+            return False
+        if self.kinds is None:
+            return True
+        if kind == 'group':
+            return (self.groups and self.selects(element.findtext('name'), 'group')) or kind in self.kinds or \
+                element.find('member') is not None
+        if kind == 'page':
+            return self.pages or kind in self.kinds
+        if kind == 'namespace':
+            return self.groups or self.selects(element.findtext('name'), kind)
+        return kind in self.kinds and (self.groups or self.selects(element.findtext('name'), kind))
+
+    def selects(self, name, kind):
+        """True if compound `name` of `kind` is in the output selected by `only`.
+
+        `only` names groups in `groups` mode and namespaces otherwise; a
+        namespace also selects the namespaces and classes it contains.
+        """
+        if self.only is None:
+            return True
+        if kind == 'group':
+            return name in self.only
+        return any(name == prefix or name.startswith(prefix + '::') for prefix in self.only)
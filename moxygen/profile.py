@@ -0,0 +1,141 @@
+import heapq
+import json
+import sys
+import time
+
+
+class Timer:
+    """Context manager adding one call of a phase to a `Profiler`."""
+    __slots__ = ('profiler', 'name', 'wall', 'cpu', 'blocks', 'elapsed')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.blocks = sys.getallocatedblocks()
+        self.cpu = time.process_time()
+        self.wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        blocks = sys.getallocatedblocks() - self.blocks
+        self.profiler.add(self.name, self.elapsed, cpu, blocks)
+        return False
+
+
+class NullTimer:
+    __slots__ = ()
+    elapsed = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+class Profiler:
+    """Wall time, CPU time and allocations per phase of a run.
+
+    Phases nest (``to_markdown`` runs inside ``parse_compound``), so the time of a phase
+    includes the phases it contains. Allocations are the net change in the
+    number of allocated memory blocks. Work done by worker processes with
+    ``--jobs``, and by the threads writing the output files, is only seen as
+    the time the main thread waits for it.
+    The cost of each compound is also kept, to report the slowest ones.
+    """
+
+    enabled = True
+
+    def __init__(self, top=10):
+        self.top = top
+        self.phases = {}
+        self.compounds = {}
+        self.start = time.perf_counter()
+        self.start_cpu = time.process_time()
+
+    def phase(self, name):
+        return Timer(self, name)
+
+    def add(self, name, wall, cpu, blocks):
+        phase = self.phases.get(name)
+        if phase is None:
+            self.phases[name] = [1, wall, cpu, blocks]
+        else:
+            phase[0] += 1
+            phase[1] += wall
+            phase[2] += cpu
+            phase[3] += blocks
+
+    def compound(self, compound, name, wall):
+        """Time `wall` spent on `compound` in phase `name`."""
+        key = compound.refid or compound.id
+        entry = self.compounds.get(key)
+        if entry is None:
+            entry = self.compounds[key] = {'refid': key, 'kind': compound.kind, 'name': compound.name}
+        entry[name] = entry.get(name, 0.0) + wall
+
+    def slowest(self):
+        def total(entry):
+            return sum(value for key, value in entry.items() if key in self.phases)
+        return [dict(entry, total=total(entry)) for entry in heapq.nlargest(self.top, self.compounds.values(), key=total)]
+
+    def report(self):
+        return {
+            'wall': time.perf_counter() - self.start,
+            'cpu': time.process_time() - self.start_cpu,
+            'phases': {name: {'calls': calls, 'wall': wall, 'cpu': cpu, 'blocks': blocks}
+                       for name, (calls, wall, cpu, blocks) in self.phases.items()},
+            'slowest': self.slowest(),
+        }
+
+    def summary(self, report=None):
+        report = report or self.report()
+        lines = ['Total: {:.3f}s wall, {:.3f}s cpu'.format(report['wall'], report['cpu']),
+                 '{:<16} {:>8} {:>10} {:>10} {:>12}'.format('phase', 'calls', 'wall (s)', 'cpu (s)', 'blocks')]
+        for name, phase in report['phases'].items():
+            lines.append('{:<16} {:>8} {:>10.3f} {:>10.3f} {:>12}'.format(
+                name, phase['calls'], phase['wall'], phase['cpu'], phase['blocks']))
+        if report['slowest']:
+            lines.append('Slowest compounds:')
+            for entry in report['slowest']:
+                lines.append('  {:>8.4f}s  {} {}'.format(entry['total'], entry['kind'], entry['name']))
+        return '\n'.join(lines)
+
+    def save(self, filename):
+        report = self.report()
+        with open(filename, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+        return report
+
+
+class NullProfiler:
+    """Profiler used when profiling is off; every phase is a no-op."""
+
+    enabled = False
+
+    def phase(self, name):
+        return NULL_TIMER
+
+    def compound(self, compound, name, wall):
+        pass
+
+
+# The profiler of the current run
+profiler = NullProfiler()
+
+
+def initProfiler(options):
+    global profiler
+    profiler = Profiler(options.get('profile_top') or 10) if options.get('profile') else NullProfiler()
+    return profiler
+
+
+def getProfiler():
+    return profiler
@@ -0,0 +1,65 @@
+"""Symbol search index for the generated markdown.
+
+Built from the parsed tree while the documents of the first target are laid
+out, so it costs no XML parsing and no pass over the markdown. Every
+compound and member written to a document is listed with its qualified name,
+kind, one line summary and the URL of its anchor, found with the same
+`helper.ref_paths` map `helper.resolve_refs` uses for links. The index is
+one JSON file:
+
+    [{"name": "transport::Bicycle", "kind": "class", "url": "api.md#classtransport_1_1Bicycle",
+      "summary": "Standard bicycle class."}, ...]
+
+URLs are relative to the directory of the index, so it can be served next to
+the markdown.
+"""
+import json
+import os
+import re
+
+# Compounds whose name qualifies the names of their members
+SCOPE_KINDS = frozenset(('namespace', 'class', 'struct', 'union', 'interface'))
+
+# Markdown links, kept as their text in summaries
+LINK_PATTERN = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+
+
+class SearchIndex:
+    """Collects the symbols of the documents of one target for `filepath`."""
+
+    def __init__(self, filepath, paths):
+        self.filepath = filepath
+        self.paths = paths
+        self.start = os.path.dirname(filepath) or os.curdir
+        self.symbols = {}
+        # URL of each output file, relative to the index
+        self.urls = {}
+
+    def add(self, documents):
+        """Add the compounds of `documents`, as given by `Moxygen.documents`,
+        and their filtered members."""
+        for document, compounds in documents:
+            for compound in compounds:
+                self.add_symbol(compound, compound.name)
+                scope = compound.name + '::' if compound.kind in SCOPE_KINDS else ''
+                for member in compound.filtered.get('members', ()):
+                    self.add_symbol(member, scope + member.name)
+
+    def add_symbol(self, item, name):
+        refid = item.refid
+        if not refid or refid in self.symbols:
+            return
+        path = self.paths.get(refid)
+        if not path:
+            # Not placed in any file, or left out by `only`: there is nothing to link to
+            return
+        url = self.urls.get(path)
+        if url is None:
+            url = self.urls[path] = os.path.relpath(path, self.start).replace(os.sep, '/')
+        self.symbols[refid] = {'name': name, 'kind': item.kind, 'url': url + '#' + refid,
+                               'summary': LINK_PATTERN.sub(r'\1', item.summary or '')}
+
+    def dumps(self):
+        """The index as compact JSON, sorted by name."""
+        symbols = sorted(self.symbols.values(), key=lambda symbol: (symbol['name'].lower(), symbol['url']))
+        return json.dumps(symbols, ensure_ascii=False, separators=(',', ':'))
@@ -1,56 +1,123 @@
+import hashlib
 import os
 import os.path as path
+import sys
+import time
 import pybars as handlebars
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 import moxygen.doxyparser as doxyparser
 import moxygen.helper as helper
+import moxygen.native as native
+from moxygen.cache import Cache
+from moxygen.hierarchy import FIELDS as HIERARCHY_FIELDS
 from moxygen.logger import getLogger
+from moxygen.profile import getProfiler
+
+# Compiled templates shared by every Renderer in this process, by template key
+compiled_templates = {}
+
+
+def template_key(source):
+    # Compiled code depends on the template source, the pybars code generator
+    # and the bytecode format of the running interpreter.
+    digest = hashlib.sha1(source.encode('utf-8')).hexdigest()
+    return '{}-{}-{}'.format(digest, handlebars.__version__, sys.implementation.cache_tag)
+
+
+def compile_template(compiler, source, filename, cache=None):
+    key = template_key(source)
+    template = compiled_templates.get(key)
+    if template is None:
+        code = cache.get_template(key) if cache is not None else None
+        if code is None:
+            code = compile(compiler.precompile(source), filename, 'exec', dont_inherit=True)
+            if cache is not None:
+                cache.set_template(key, code)
+        namespace = {}
+        exec(code, namespace)
+        template = compiled_templates[key] = namespace['render']
+    return template
 
 
 class Renderer:
     def __init__(self, options):
         # Loaded templates
         self.compiler = handlebars.Compiler()
-        print(dir(self.compiler))
         self.templates = {}
+        self.native = {}
+        self.digests = {}
+        # Hierarchy fields each template reads, see `hierarchy.FIELDS`
+        self.reads = {}
         self.helpers = {}
         self.options = options
+        self.cache = None
 
-    # Load templates from the given directory
+    # Load templates from the given directory. All templates are compiled here
+    # (or taken from the compiled template cache) so rendering never compiles.
+    # Unmodified built-in templates use their native renderer instead, unless
+    # the `native` option is off.
     def load(self, template_directory):
         for filename in os.listdir(template_directory):
             fullname = path.join(template_directory, filename)
             with open(fullname, 'r', encoding='utf-8') as file:
-                template = self.compiler.compile(file.read()) #NoEscape=True, ,  strict=True
-                self.templates[filename[:-3]] = template
+                source = file.read()
+                name = filename[:-3]
+                self.digests[name] = hashlib.sha1(source.encode('utf-8')).hexdigest()
+                self.reads[name] = tuple(key for key in HIERARCHY_FIELDS if key in source)
+                if self.options.get('native', True):
+                    template = native.native_template(name, self.digests[name])
+                    if template is not None:
+                        self.native[name] = self.templates[name] = template
+                        continue
+                template = compile_template(self.compiler, source, fullname, self.cache) #NoEscape=True, ,  strict=True
+                self.templates[name] = template
 
-    def render(self, compound):
+    def template_name(self, compound):
         log = getLogger()
-        template = None
-        print("COMPOUND")
-        print(compound)
-        log.info(f'Rendering {compound.kind} {compound.name}')
-
         if compound.kind == 'index':
-            template = 'index'
+            return 'index'
         elif compound.kind == 'page':
-            template = 'page'
+            return 'page'
         elif compound.kind in ['group', 'namespace']:
             if len(compound.compounds) == 1 and \
                compound.compounds[next(iter(compound["compounds"]))]["kind"] == 'namespace':
                 return None
-            template = 'namespace'
+            return 'namespace'
         elif compound.kind in ['class', 'struct', 'interface']:
-            template = 'class'
+            return 'class'
         else:
-            log.warning(f'Cannot render {compound.kind} {compound.name}')
-            log.warning(f'Skipping {compound}')
+            log.info('Cannot render %s %s, skipping it', compound.kind, compound.name)
             return None
 
+    def render(self, compound):
+        log = getLogger()
+        log.debug('Rendering %s %s', compound.kind, compound.name)
+
+        template = self.template_name(compound)
+        if template is None:
+            return None
         if template not in self.templates:
             raise ValueError(f'Template "{template}" not found in your templates directory.')
-        result = self.templates[template](compound, helpers=self.helpers)
-        print(result)
+        profiler = getProfiler()
+        with profiler.phase('render') as timer:
+            if self.cache is not None:
+                key = self.cache.render_key(template, self.digests[template], compound, self.reads[template])
+                result = self.cache.get_rendered(key)
+                if result is not None:
+                    return result
+            result = self.render_template(template, compound)
+            if self.cache is not None:
+                self.cache.set_rendered(key, result)
+        profiler.compound(compound, 'render', timer.elapsed)
+        return result
+
+    def render_template(self, template, compound):
+        if template in self.native:
+            result = self.native[template](compound, self.options)
+        else:
+            result = self.templates[template](compound, helpers=self.helpers)
         return result.replace(r'(\r\n|\r|\n){3,}', r'$1\n')
 
     def render_array(self, compounds):
@@ -58,26 +125,159 @@ class Renderer:
 
     # Register handlebars helper
     def register_helper(self, options):
-        print(options)
         # Escape the code for a table cell.
-        def cell(code, options, items):
+        def cell(this, code):
             return code.replace('|', r'\|').replace('\n', '<br/>')
         self.helpers['cell']= cell
         #self.compiler._helpers['cell']=cell
 
         # Escape the code for titles.
-        def title(code, options, items):
+        def title(this, code):
             return code.replace('\n', '<br/>')
         self.helpers['title']= title
         #self.compiler._helpers['title']=title
 
         # Generate an anchor for internal links
-        def anchor(name, options):
-            return helper.get_anchor(name, options)
+        def anchor(this, name):
+            return helper.get_anchor(name, self.options)
         self.helpers['anchor']= anchor
         #self.compiler._helpers['anchor']=anchor
 
 
+class RenderBatch:
+    """Documents of one or more renderers, rendered together.
+
+    `add` takes the documents of one renderer and has to be called while the
+    tree is filtered for them. `results` hands the rendered documents out in
+    order, each as soon as it is ready, so they can be written while the
+    rest are rendered.
+
+    With one job, documents are rendered as `results` hands them out, so
+    they have to be taken before the tree is filtered for another renderer.
+    With more, compounds that are not in the render cache are detached from
+    the tree, so the tree can be filtered again for the next renderer, and
+    `results` renders them all in one pool of worker processes, each with the
+    compiled templates of every renderer. At most `jobs` times `IN_FLIGHT`
+    chunks of compounds are rendered ahead of the document handed out next.
+    """
+
+    # Chunks of compounds submitted per worker process at a time
+    IN_FLIGHT = 2
+
+    def __init__(self, jobs=1):
+        self.jobs = jobs
+        self.renderers = []
+        # (renderer index, document index, compounds, rendered compounds) not handed out yet
+        self.documents = []
+        # Compounds left to render in the worker processes
+        self.pending = []
+
+    def add(self, renderer, documents):
+        index = len(self.renderers)
+        self.renderers.append(renderer)
+        if self.jobs <= 1:
+            self.documents.extend((index, i, compounds, None) for i, compounds in enumerate(documents))
+            return
+
+        log = getLogger()
+        for i, compounds in enumerate(documents):
+            results = [None] * len(compounds)
+            for j, compound in enumerate(compounds):
+                log.debug('Rendering %s %s', compound.kind, compound.name)
+                template = renderer.template_name(compound)
+                if template is None:
+                    continue
+                if template not in renderer.templates:
+                    raise ValueError(f'Template "{template}" not found in your templates directory.')
+                key = None
+                if renderer.cache is not None:
+                    key = renderer.cache.render_key(template, renderer.digests[template], compound,
+                                                    renderer.reads[template])
+                    results[j] = renderer.cache.get_rendered(key)
+                    if results[j] is not None:
+                        continue
+                self.pending.append((len(self.documents), j, index, key, template, compound,
+                                     compound.detach(reads=renderer.reads[template])))
+            self.documents.append((index, i, compounds, results))
+
+    def results(self):
+        """Yield ``(renderer index, document index, contents)`` for every
+        document added since the last call, in order."""
+        documents, self.documents = self.documents, []
+        pending, self.pending = self.pending, []
+        if self.jobs <= 1:
+            for index, i, compounds, results in documents:
+                yield index, i, self.renderers[index].render_array(compounds)
+            return
+
+        # Compounds still being rendered, per document
+        remaining = [0] * len(documents)
+        for entry in pending:
+            remaining[entry[0]] += 1
+        done = 0
+        if pending:
+            profiler = getProfiler()
+            options = [renderer.options for renderer in self.renderers]
+            cache_dir = next((renderer.cache.directory for renderer in self.renderers if renderer.cache is not None), None)
+            size = max(1, len(pending) // (self.jobs * 8))
+            chunks = iter([pending[start:start + size] for start in range(0, len(pending), size)])
+            in_flight = deque()
+            with ProcessPoolExecutor(max_workers=self.jobs, initializer=init_worker,
+                                     initargs=(options, cache_dir)) as executor:
+                while True:
+                    # Keep the workers busy without rendering too far ahead
+                    while len(in_flight) < self.jobs * self.IN_FLIGHT:
+                        chunk = next(chunks, None)
+                        if chunk is None:
+                            break
+                        in_flight.append((chunk, executor.submit(render_chunk, [
+                            (index, template, detached) for d, j, index, key, template, compound, detached in chunk])))
+                    if not in_flight:
+                        break
+                    chunk, future = in_flight.popleft()
+                    with profiler.phase('render'):
+                        rendered = future.result()
+                    for (d, j, index, key, template, compound, detached), (result, elapsed) in zip(chunk, rendered):
+                        documents[d][3][j] = result
+                        remaining[d] -= 1
+                        profiler.compound(compound, 'render', elapsed)
+                        if key is not None:
+                            self.renderers[index].cache.set_rendered(key, result)
+                    while done < len(documents) and not remaining[done]:
+                        index, i, compounds, results = documents[done]
+                        yield index, i, results
+                        done += 1
+        for index, i, compounds, results in documents[done:]:
+            yield index, i, results
+
+
+# Renderers of the current worker process, one per renderer of the `RenderBatch`
+worker_renderers = []
+
+
+def init_worker(options, cache_dir=None):
+    for renderer_options in options:
+        renderer = Renderer(renderer_options)
+        if cache_dir is not None:
+            renderer.cache = Cache(cache_dir)
+        renderer.register_helper(renderer_options)
+        renderer.load(renderer_options['template'])
+        # Rendered results are cached by the parent process
+        renderer.cache = None
+        worker_renderers.append(renderer)
+
+
+def render_worker(job):
+    index, template, compound = job
+    start = time.perf_counter()
+    result = worker_renderers[index].render_template(template, compound)
+    return result, time.perf_counter() - start
+
+
+def render_chunk(jobs):
+    return [render_worker(job) for job in jobs]
+
+
 if __name__ == "__main__":
     r = Renderer()
     options = {}